@@ -22,16 +22,20 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
 # EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import itertools
+import json
 import logging
 import os
 import signal
-from typing import Any
+import time
+from typing import TYPE_CHECKING, Any, Callable
 
 from pywayland.protocol.wayland import WlSeat
 from pywayland.server import Display, Listener
 from pywayland.server.eventloop import EventSource
+from wlroots import ffi
 from wlroots import helper as wlroots_helper
-from wlroots import xwayland
+from wlroots.backend import BackendType
 from wlroots.wlr_types import (
     Cursor,
     DataControlManagerV1,
@@ -43,6 +47,7 @@ from wlroots.wlr_types import (
     OutputLayout,
     PrimarySelectionV1DeviceManager,
     Scene,
+    SceneNode,
     ScreencopyManagerV1,
     Surface,
     XCursorManager,
@@ -54,7 +59,11 @@ from wlroots.wlr_types.cursor import WarpMode
 from wlroots.wlr_types.idle import Idle
 from wlroots.wlr_types.idle_inhibit_v1 import IdleInhibitorManagerV1
 from wlroots.wlr_types.input_device import InputDevice, InputDeviceType
-from wlroots.wlr_types.layer_shell_v1 import LayerShellV1, LayerSurfaceV1
+from wlroots.wlr_types.layer_shell_v1 import (
+    LayerShellV1,
+    LayerShellV1Layer,
+    LayerSurfaceV1,
+)
 from wlroots.wlr_types.output_management_v1 import OutputManagerV1
 from wlroots.wlr_types.output_power_management_v1 import OutputPowerManagerV1
 from wlroots.wlr_types.pointer import (
@@ -65,23 +74,68 @@ from wlroots.wlr_types.pointer import (
 )
 from wlroots.wlr_types.xdg_shell import XdgShell, XdgSurface, XdgSurfaceRole
 
+from libnext import util
+from libnext._wlroots import lib as next_lib
+from libnext.control import Control
+from libnext.focus import FocusManager
 from libnext.inputs import NextKeyboard
+from libnext.keybindings import DEFAULT_KEYBINDINGS, Keybinding, compile_keybindings
+from libnext.layers import LayerSurface
 from libnext.layout_manager import LayoutManager
+from libnext.metrics import Metrics, listener_metrics
+from libnext.output_config import OutputConfigurator
 from libnext.outputs import NextOutput
+from libnext.profiler import SamplingProfiler
+from libnext.render_scheduler import MaxRenderTime
+from libnext.spatial import SpatialIndex
+from libnext.startup_profile import StartupProfile
+from libnext.transaction import TransactionManager
 from libnext.util import Listeners
 from libnext.window import WindowType, XdgWindow
+from libnext.window_stack import WindowStack
+
+if TYPE_CHECKING:
+    from wlroots import xwayland
+
+    from libnext.xwayland import XWaylandUnmanaged
 
 log = logging.getLogger("Next: Backend")
 
 
 class NextCore(Listeners):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        backend_type: BackendType = BackendType.AUTO,
+        coalesce_motion: bool = False,
+        adaptive_sync: set[str] | None = None,
+        max_render_time: MaxRenderTime = None,
+        xwayland_prewarm: bool = False,
+        startup_profile: StartupProfile | None = None,
+    ) -> None:
         """
         Setup nextwm
+
+        The compositor is only built here, call run() to start the backend and
+        enter the event loop.
+
+        With coalesce_motion relative pointer motion is accumulated and applied
+        once per output frame instead of once per event.
+
+        adaptive_sync holds the names of outputs to enable variable refresh
+        rate on, "*" matches every output.
+
+        max_render_time delays rendering until that many milliseconds before
+        the next vblank, "auto" estimates it from recent render times. See
+        RenderScheduler.
+
+        XWayland normally starts when the first X11 client connects, with
+        xwayland_prewarm it's started once the first frame is out instead.
+
+        startup_profile gets the startup phases marked on it and is printed
+        once the first frame is committed.
         """
         if os.getenv("XDG_RUNTIME_DIR") is None or os.getenv("XDG_RUNTIME_DIR") == "":
-            log.error("XDG_RUNTIME_DIR is not set in the environment")
-            return
+            raise RuntimeError("XDG_RUNTIME_DIR is not set in the environment")
 
         self.display: Display = Display()
         self.event_loop = self.display.get_event_loop()
@@ -99,13 +153,17 @@ class NextCore(Listeners):
                     handled_signal, self.signal_callback, self.display
                 )
             )
+        # SIGUSR1 dumps the metrics, see dump_metrics().
+        self.event_loop_callbacks.append(
+            self.event_loop.add_signal(signal.SIGUSR1, self._on_dump_metrics, None)
+        )
 
         (
             self.compositor,
             self.allocator,
             self.renderer,
             self.backend,
-        ) = wlroots_helper.build_compositor(self.display)
+        ) = wlroots_helper.build_compositor(self.display, backend_type=backend_type)
 
         self.renderer.init_display(self.display)
         self.socket = self.display.add_socket()
@@ -116,16 +174,36 @@ class NextCore(Listeners):
         self.add_listener(self.backend.new_input_event, self._on_new_input)
         self.add_listener(self.backend.new_output_event, self._on_new_output)
 
+        self.metrics = Metrics()
+        self.profiler = SamplingProfiler()
+
+        # Window borders.
+        self.border_width: int = 2
+        self.border_color_focused = util.color("#81a1c1")
+        self.border_color_normal = util.color("#3b4252")
+
         # These windows have not been mapped yet.
         # They'll get managed when mapped.
         self.pending_windows: set[WindowType] = set()
-        self.mapped_windows: list[WindowType] = []
+        # Focus order of all mapped windows, outputs keep their own stacks.
+        self.mapped_windows: WindowStack[WindowType] = WindowStack()
+
+        # Layout boxes of mapped windows, used to find the window under the
+        # cursor. Windows get a higher z_index every time they're raised.
+        self.window_index: SpatialIndex[WindowType] = SpatialIndex()
+        self.z_order = itertools.count(1)
+        self.window_ids = itertools.count(1)
+        self.focus = FocusManager(self)
+        self.transactions = TransactionManager(self)
 
         # List of outputs managed by the compositor.
         self.outputs: list[NextOutput] = []
+        # Outputs turned off through output management.
+        self.disabled_outputs: list[NextOutput] = []
 
         # Input configuration.
         self.keyboards: list[NextKeyboard] = []
+        self.set_keybindings(DEFAULT_KEYBINDINGS)
 
         DataDeviceManager(self.display)
         DataControlManagerV1(self.display)
@@ -145,18 +223,53 @@ class NextCore(Listeners):
         # Output configuration.
         self.output_layout: OutputLayout = OutputLayout()
         self.scene: Scene = Scene(self.output_layout)
-        self.output_manager: OutputManagerV1 = OutputManagerV1(self.display)
-        self.layout_manager = LayoutManager(self.display)
+        # Scene trees from bottom to top, windows and override-redirect X11
+        # windows go between the bottom and top layer shell layers. Outputs
+        # add their own trees under the layer trees.
+        background, bottom, self.window_tree, self.unmanaged_tree, top, overlay = (
+            SceneNode(next_lib.next_scene_tree_create(self.scene.node._ptr))
+            for _ in range(6)
+        )
+        self.layer_trees: dict[int, SceneNode] = {
+            LayerShellV1Layer.BACKGROUND: background,
+            LayerShellV1Layer.BOTTOM: bottom,
+            LayerShellV1Layer.TOP: top,
+            LayerShellV1Layer.OVERLAY: overlay,
+        }
+        # presentation-time feedback for surfaces in the scene.
+        self.presentation = next_lib.wlr_presentation_create(
+            self.display._ptr, self.backend._ptr
+        )
+        next_lib.wlr_scene_set_presentation(self.scene._ptr, self.presentation)
+        self.adaptive_sync_outputs: set[str] = adaptive_sync or set()
+        self.max_render_time = max_render_time
+        # Monotonic nanoseconds, frame scheduling reads time through this.
+        self.clock: Callable[[], int] = time.monotonic_ns
+        self.output_config = OutputConfigurator(self)
+        self.output_manager: OutputManagerV1 = self.output_config.manager
+        self.layout_manager = LayoutManager(self)
+        self.control = Control(self)
+        # Layout used by outputs that don't pick one.
+        self.default_layout_namespace: str = "master-stack"
 
         # Cursor configuration
         self.cursor: Cursor = Cursor(self.output_layout)
 
         self.cursor_manager: XCursorManager = XCursorManager(24)
+        # Name of the xcursor image in use, None when a client set its own.
+        self.cursor_image: str | None = None
+
+        # Relative motion waiting for flush_cursor_motion().
+        self.coalesce_motion = coalesce_motion
+        self.motion_pending: bool = False
+        self.motion_dx: float = 0.0
+        self.motion_dy: float = 0.0
+        self.motion_time_msec: int = 0
+        self.motion_device: InputDevice | None = None
+
         self.add_listener(self.cursor.axis_event, self._on_cursor_axis)
         self.add_listener(self.cursor.button_event, self._on_cursor_button)
         self.add_listener(self.cursor.frame_event, self._on_cursor_frame)
-        # TODO: On motion check the view under the cursor and focus.
-        # Or focus on click? NOTE: Use wlroots scene_graph node_at func for this.
         self.add_listener(self.cursor.motion_event, self._on_cursor_motion)
         self.add_listener(
             self.cursor.motion_absolute_event, self._on_cursor_motion_absolute
@@ -192,23 +305,70 @@ class NextCore(Listeners):
         self.idle = Idle(self.display)
         self.foreign_toplevel_managerv1 = ForeignToplevelManagerV1.create(self.display)
 
-        # XWayland initialization.
-        # True -> lazy evaluation.
-        # A.K.A XWayland is started when a client needs it.
-        self.xwayland = xwayland.XWayland(self.display, self.compositor, True)
+        # Override-redirect X11 windows, newest last.
+        self.unmanaged: list[XWaylandUnmanaged] = []
+        self.first_frame_done: bool = False
+        self.xwayland_prewarm = xwayland_prewarm
+        self.xwayland: xwayland.XWayland | None = None
+        if not xwayland_prewarm:
+            # Lazy, XWayland is started when a client needs it.
+            self.start_xwayland(True)
+
+        self.startup_profile = startup_profile
+        if startup_profile is not None:
+            startup_profile.mark("compositor setup")
+
+    def start_xwayland(self, lazy: bool) -> None:
+        """
+        Create the XWayland server and point DISPLAY at it.
+        """
+        # Only keeps X11 support off the startup path with xwayland_prewarm,
+        # the lazy server is created, and this imported, from __init__().
+        from wlroots import xwayland
+
+        self.xwayland = xwayland.XWayland(self.display, self.compositor, lazy)
         if not self.xwayland:
             log.error("Failed to setup XWayland. Continuing without.")
-        else:
-            self.xwayland.set_seat(self.seat)
-            os.environ["DISPLAY"] = self.xwayland.display_name or ""
-            log.info(f"XWAYLAND DISPLAY {self.xwayland.display_name}")
+            self.xwayland = None
+            return
+
+        self.xwayland.set_seat(self.seat)
+        self.add_listener(
+            self.xwayland.new_surface_event, self._on_new_xwayland_surface
+        )
+        os.environ["DISPLAY"] = self.xwayland.display_name or ""
+        log.info(f"XWAYLAND DISPLAY {self.xwayland.display_name}")
 
+    def first_frame(self) -> None:
+        """
+        Called once the first frame got committed on any output.
+        """
+        self.first_frame_done = True
+        if self.startup_profile is not None:
+            self.startup_profile.mark("first frame")
+            print(self.startup_profile.report())
+        if self.xwayland_prewarm and self.xwayland is None:
+            # Only once the event loop is idle so the next frames don't wait
+            # on the X server.
+            self.event_loop.add_idle(self._on_prewarm_xwayland)
+
+    def start(self) -> None:
+        """
+        Start the backend without entering the event loop.
+        """
         self.backend.start()
 
         # Getting output_layout dimensions and setting the cursor to spawn in the middle of it.
         layout_box = self.output_layout.get_box(None)
         self.cursor.warp(WarpMode.Layout, layout_box.width / 2, layout_box.height / 2)
+        if self.startup_profile is not None:
+            self.startup_profile.mark("backend start")
 
+    def run(self) -> None:
+        """
+        Start the backend and run the event loop until the display is terminated.
+        """
+        self.start()
         self.display.run()
 
         # Cleanup
@@ -220,6 +380,7 @@ class NextCore(Listeners):
 
     # Resource cleanup.
     def destroy(self) -> None:
+        self.profiler.stop()
         self.destroy_listeners()
         [
             event_loop_callback.remove()
@@ -229,10 +390,14 @@ class NextCore(Listeners):
         [keyboard.destroy_listeners() for keyboard in self.keyboards]
 
         [output.destroy_listeners() for output in self.outputs]
+        [output.destroy_listeners() for output in self.disabled_outputs]
+        self.output_config.destroy_listeners()
 
-        if self.xwayland:
+        if self.xwayland is not None:
             self.xwayland.destroy()
         self.layout_manager.destroy()
+        self.control.destroy()
+        self.transactions.destroy()
         self.cursor.destroy()
         self.cursor_manager.destroy()
         self.output_layout.destroy()
@@ -241,47 +406,199 @@ class NextCore(Listeners):
         self.display.destroy()
         log.debug("Server destroyed")
 
-    def focus_window(self, window: WindowType, surface: Surface | None = None) -> None:
-        if self.seat.destroyed:
-            return
-        if surface is None and window is not None:
-            surface = window.surface.surface
+    def focus_window(
+        self, window: WindowType | None, surface: Surface | None = None
+    ) -> None:
+        self.focus.focus(window, surface)
 
-        previous_surface = self.seat.keyboard_state.focused_surface
-        if previous_surface == surface:
-            log.error("Focus requested on currently focused surface. Focus unchanged.")
+    def manage_window(self, window: WindowType) -> None:
+        """
+        Add a newly mapped window to the window stacks.
+        It's placed on the output under the cursor.
+        """
+        output = self.output_at(self.cursor.x, self.cursor.y)
+        if output is None and self.outputs:
+            output = self.outputs[0]
+
+        window.output = output
+        self.mapped_windows.push(window)
+        if output is not None:
+            # New windows show up on the tags in view.
+            window.tags = output.tags
+            output.add_window(window)
+            self.layout_manager.arrange(output)
+        self.control.emit("window-mapped", window=window)
+
+    def unmanage_window(self, window: WindowType) -> None:
+        """
+        Drop an unmapped window from the window stacks and focus the next one.
+        """
+        self.control.emit("window-unmapped", window=window)
+        self.focus.forget(window)
+        self.transactions.forget(window)
+        self.mapped_windows.remove(window)
+        self.window_index.remove(window)
+        if window.output is not None:
+            window.output.remove_window(window)
+            self.layout_manager.arrange(window.output)
+
+        if self.focus.focused is None:
+            self.focus_window(
+                next((other for other in self.mapped_windows if other.enabled), None)
+            )
+
+    def metrics_snapshot(self) -> dict:
+        """
+        Counters, listener timings and frame counts per output.
+        """
+        return {
+            "counters": self.metrics.snapshot(),
+            "listeners": listener_metrics.snapshot(),
+            "outputs": {
+                output.wlr_output.name: {
+                    "frames_rendered": output.frames_rendered,
+                    "frames_skipped": output.frames_skipped,
+                    "frames_scanned_out": output.frames_scanned_out,
+                }
+                for output in self.outputs
+            },
+        }
+
+    def dump_metrics(self) -> str:
+        """
+        Write metrics_snapshot() as JSON next to the wayland socket.
+        Returns the path written to.
+        """
+        return self.write_report(
+            "metrics", "json", json.dumps(self.metrics_snapshot(), indent=2)
+        )
+
+    def dump_profile(self, limit: int) -> str:
+        """
+        Write the limit hottest profiled stacks next to the wayland socket.
+        Returns the path written to.
+        """
+        return self.write_report("profile", "txt", self.profiler.collapsed(limit))
+
+    def write_report(self, name: str, extension: str, text: str) -> str:
+        path = os.path.join(
+            os.environ["XDG_RUNTIME_DIR"], f"next-{name}-{os.getpid()}.{extension}"
+        )
+        # Readers never see a half written file.
+        with open(path + ".tmp", "w") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def wants_adaptive_sync(self, name: str | None) -> bool:
+        return "*" in self.adaptive_sync_outputs or name in self.adaptive_sync_outputs
+
+    def output_at(self, lx: float, ly: float) -> NextOutput | None:
+        wlr_output = self.output_layout.output_at(lx, ly)
+        if wlr_output is None:
+            return None
+        return wlr_output.data
+
+    def window_at(
+        self, lx: float, ly: float
+    ) -> tuple[WindowType, Surface, float, float] | None:
+        """
+        Find the topmost window and surface at the given layout coordinates.
+        Returns the window, the surface and the surface local coordinates.
+        """
+        candidates = self.window_index.query(lx, ly)
+        if len(candidates) > 1:
+            candidates.sort(key=lambda window: window.z_index, reverse=True)
+
+        for window in candidates:
+            surface, sx, sy = window.surface.surface_at(
+                lx - window.x - window.borderwidth, ly - window.y - window.borderwidth
+            )
+            if surface is not None:
+                return window, surface, sx, sy
+        return None
+
+    def surface_at(self, lx: float, ly: float) -> tuple[Surface, float, float] | None:
+        """
+        Find the surface at the given layout coordinates, layer surfaces in
+        the top and overlay layers cover windows, the others are below them.
+        """
+        output = self.output_at(lx, ly)
+        if output is not None:
+            found = output.layer_surface_at(
+                lx, ly, (LayerShellV1Layer.OVERLAY, LayerShellV1Layer.TOP)
+            )
+            if found is not None:
+                return found
+
+        for unmanaged in reversed(self.unmanaged):
+            found = unmanaged.surface_at(lx, ly)
+            if found is not None:
+                return found
+
+        found = self.window_at(lx, ly)
+        if found is not None:
+            _window, surface, sx, sy = found
+            return surface, sx, sy
+
+        if output is not None:
+            return output.layer_surface_at(
+                lx, ly, (LayerShellV1Layer.BOTTOM, LayerShellV1Layer.BACKGROUND)
+            )
+        return None
+
+    def process_cursor_motion(self, time_msec: int) -> None:
+        """
+        Send pointer focus and motion to the surface under the cursor.
+        """
+        found = self.surface_at(self.cursor.x, self.cursor.y)
+        focused_surface = self.seat._ptr.pointer_state.focused_surface
+
+        if found is None:
+            # Clients set their own cursor image, so only do this over empty space.
+            self.set_cursor_image("left_ptr")
+            if focused_surface != ffi.NULL:
+                self.seat.pointer_notify_clear_focus()
             return
 
-        if previous_surface is not None:
-            if previous_surface.is_xdg_surface:
-                previous_xdg_surface = XdgSurface.from_surface(previous_surface)
-                if not window or window.surface != previous_xdg_surface:
-                    previous_xdg_surface.set_activated(False)
-                    if previous_xdg_surface.data:  # We store the ftm handle in data.
-                        previous_xdg_surface.data.set_activated(False)
-
-            if previous_surface.is_xwayland_surface:
-                previous_xwayland_surface = xwayland.Surface.from_wlr_surface(
-                    previous_surface
-                )
-                if not window or window.surface != previous_xwayland_surface:
-                    previous_xwayland_surface.activate(False)
-                    if (
-                        previous_xwayland_surface.data
-                    ):  # We store the ftm handle in data.
-                        previous_xwayland_surface.data.set_activated(False)
-
-        if not window:
-            self.seat.keyboard_clear_focus()
+        surface, sx, sy = found
+        if focused_surface == surface._ptr:
+            self.seat.pointer_notify_motion(time_msec, sx, sy)
+        else:
+            self.seat.pointer_notify_enter(surface, sx, sy)
+
+    def flush_cursor_motion(self) -> None:
+        """
+        Apply coalesced pointer motion, followed by the pointer frame that was
+        held back for it.
+        """
+        if not self.motion_pending:
             return
 
-        log.debug("Focusing on surface")
-        window.scene_node.raise_to_top()
-        window.surface.set_activated(True)
-        if window.surface.data:
-            window.surface.set_activated(True)  # Setting ftm_handle to activated_true
+        self.motion_pending = False
+        self.cursor.move(
+            self.motion_dx, self.motion_dy, input_device=self.motion_device
+        )
+        self.motion_dx = self.motion_dy = 0.0
+        self.process_cursor_motion(self.motion_time_msec)
+        self.seat.pointer_notify_frame()
 
-        self.seat.keyboard_notify_enter(window.surface.surface, self.seat.keyboard)
+    def set_cursor_image(self, name: str) -> None:
+        """
+        Set an xcursor image, skipped if it's the one already in use.
+        """
+        if name != self.cursor_image:
+            self.cursor_image = name
+            self.cursor_manager.set_cursor_image(name, self.cursor)
+
+    def set_keybindings(self, keybindings: list[Keybinding]) -> None:
+        """
+        Compile keybindings into the lookup table used on every key press.
+        Call this again to reload them.
+        """
+        self.keybindings = compile_keybindings(keybindings)
+        for keyboard in self.keyboards:
+            keyboard.invalidate_keysym_cache()
 
     def hide_cursor(self) -> None:
         log.debug("Hiding cursor")
@@ -305,11 +622,12 @@ class NextCore(Listeners):
         """
         XWayland socket name.
         """
+        if self.xwayland is None:
+            return ""
         return self.xwayland.display_name or ""
 
     # Listeners
     def _on_new_input(self, _listener: Listener, device: InputDevice) -> None:
-        log.debug("Signal: wlr_backend_new_input_event")
         match device.device_type:
             case InputDeviceType.KEYBOARD:
                 self.keyboards.append(NextKeyboard(self, device))
@@ -332,68 +650,74 @@ class NextCore(Listeners):
         )
 
     def _on_new_output(self, _listener: Listener, wlr_output: Output) -> None:
-        log.debug("Signal: wlr_backend_new_output_event")
-
         wlr_output.init_render(self.allocator, self.renderer)
+        settings = self.output_config.configure_new_output(wlr_output)
 
-        if wlr_output.modes != []:
-            mode = wlr_output.preferred_mode()
-            if mode is None:
-                log.error("New output advertised with no output mode")
-            else:
-                wlr_output.set_mode(mode)
-                wlr_output.enable()
-                wlr_output.commit()
-
-        NextOutput(self, wlr_output)
+        output = NextOutput(self, wlr_output)
+        if settings is not None:
+            if not settings.enabled:
+                output.disable()
+            elif settings.position is not None:
+                output.enable(*settings.position)
+        # Layout and clients are updated once the burst of new outputs is over.
+        self.output_config.schedule_update()
 
     def _on_request_set_selection(
         self, _listener: Listener, event: seat.RequestSetSelectionEvent
     ) -> None:
-        log.debug("Signal: wlr_seat_request_set_selection_event")
         self.seat.set_selection(event._ptr.source, event.serial)
 
     def _on_request_set_primary_selection(
         self, _listener: Listener, event: seat.RequestSetPrimarySelectionEvent
     ) -> None:
-        log.debug("Signal: wlr_seat_on_request_set_primary_selection_event")
         self.seat.set_primary_selection(event._ptr.source, event.serial)
 
     def _on_request_set_cursor(
         self, _listener: Listener, event: seat.PointerRequestSetCursorEvent
     ) -> None:
-        log.debug("Signal: wlr_seat_on_request_set_cursor")
         self.cursor.set_surface(event.surface, event.hotspot)
+        self.cursor_image = None
 
     def _on_cursor_frame(self, _listener: Listener, data: Any) -> None:
-        log.debug("Signal: wlr_cursor_frame_event")
-        self.seat.pointer_notify_frame()
+        # Pending motion sends its own frame when flushed.
+        if not self.motion_pending:
+            self.seat.pointer_notify_frame()
 
     def _on_cursor_motion(
         self, _listener: Listener, event_motion: PointerEventMotion
     ) -> None:
-        # TODO: This should get abstracted into it's own function to check if
-        # image shoud be ptr or resize type.
-        # TODO: Finish this.
-        log.debug("Signal: wlr_cursor_motion_event")
+        # TODO: Check if image should be ptr or resize type.
+        if self.coalesce_motion:
+            if not self.motion_pending:
+                self.motion_pending = True
+                # Make sure a frame comes even if nothing else is damaged.
+                for output in self.outputs:
+                    next_lib.wlr_output_schedule_frame(output.wlr_output._ptr)
+            self.motion_dx += event_motion.delta_x
+            self.motion_dy += event_motion.delta_y
+            self.motion_time_msec = event_motion.time_msec
+            self.motion_device = event_motion.device
+            return
+
         self.cursor.move(
             event_motion.delta_x, event_motion.delta_y, input_device=event_motion.device
         )
-        self.cursor_manager.set_cursor_image("left_ptr", self.cursor)
+        self.process_cursor_motion(event_motion.time_msec)
 
     def _on_cursor_motion_absolute(
         self, _listener: Listener, event_motion: PointerEventMotionAbsolute
     ) -> None:
-        log.debug("Signal: wlr_cursor_motion_absolute_event")
+        self.flush_cursor_motion()
         self.cursor.warp(
             WarpMode.LayoutClosest,
             event_motion.x,
             event_motion.y,
             input_device=event_motion.device,
         )
-        # TODO: Finish this.
+        self.process_cursor_motion(event_motion.time_msec)
 
     def _on_cursor_axis(self, _listener: Listener, event: PointerEventAxis) -> None:
+        self.flush_cursor_motion()
         self.seat.pointer_notify_axis(
             event.time_msec,
             event.orientation,
@@ -403,29 +727,57 @@ class NextCore(Listeners):
         )
 
     def _on_cursor_button(self, _listener: Listener, event: PointerEventButton) -> None:
-        log.debug("Signal: wlr_cursor_button_event")
         # TODO: If config wants focus_by_hover then do so, else focus_by_click.
 
         # NOTE: Maybe support compositor bindings involving buttons?
+        self.flush_cursor_motion()
         self.seat.pointer_notify_button(
             event.time_msec, event.button, event.button_state
         )
         self.idle.notify_activity(self.seat)
-        log.debug("Cursor button emitted to focused client")
 
     def _on_new_xdg_surface(self, _listener: Listener, surface: XdgSurface) -> None:
-        log.debug("Signal: xdg_shell_new_xdg_surface_event")
         if surface.role == XdgSurfaceRole.TOPLEVEL:
             self.pending_windows.add(XdgWindow(self, surface))
 
+    def _on_dump_metrics(self, _sig_num: int, _data: Any) -> None:
+        try:
+            log.info("Metrics written to %s", self.dump_metrics())
+        except OSError as e:
+            log.error("Failed to write metrics: %s", e)
+
+    def _on_new_xwayland_surface(
+        self, _listener: Listener, surface: "xwayland.Surface"
+    ) -> None:
+        from libnext.xwayland import new_xwayland_surface
+
+        new_xwayland_surface(self, surface)
+
+    def _on_prewarm_xwayland(self, _data: Any) -> None:
+        log.debug("Prewarming XWayland")
+        self.start_xwayland(False)
+
     def _on_new_layer_surface(
         self, _listener: Listener, surface: LayerSurfaceV1
     ) -> None:
-        log.debug("Signal: layer_shell_new_layer_surface_event")
+        wlr_output = surface.output
+        if wlr_output is not None:
+            output = wlr_output.data
+        else:
+            # The client leaves it to us, use the output under the cursor.
+            output = self.output_at(self.cursor.x, self.cursor.y)
+            if output is None and self.outputs:
+                output = self.outputs[0]
+            if output is None:
+                log.warning("No output for new layer surface")
+                surface.destroy()
+                return
+            surface.output = output.wlr_output
+
+        LayerSurface(self, output, surface)
 
     def _on_new_toplevel_decoration(
         self, _listener: Listener, decoration: xdg_decoration_v1.XdgToplevelDecorationV1
     ) -> None:
-        log.debug("Signal: xdg_decoration_v1_new_toplevel_decoration_event")
         # TODO: https://github.com/Shinyzenith/NextWM/issues/10
         decoration.set_mode(xdg_decoration_v1.XdgToplevelDecorationV1Mode.SERVER_SIDE)
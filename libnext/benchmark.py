@@ -0,0 +1,462 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import deque
+from typing import Any, Callable
+
+from pywayland.server.eventloop import EventSource
+from wlroots import lib
+from wlroots.backend import BackendType
+
+from libnext._wlroots import lib as next_lib
+from libnext.backend import NextCore
+from libnext.outputs import NextOutput
+from libnext.render_scheduler import parse_max_render_time
+from libnext.window import XdgWindow
+
+log = logging.getLogger("Next: Benchmark")
+
+# evdev codes, the headless keyboard uses the default xkb keymap.
+TYPED_KEYS = [16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 30, 31, 32, 33, 34, 35]
+BTN_LEFT = 0x110
+
+EVENT_KINDS = ["motion", "key", "button", "map", "unmap"]
+
+Step = tuple[str, int, int]
+
+
+class Stats:
+    """
+    Raw samples in nanoseconds, summarised in microseconds.
+    """
+
+    def __init__(self) -> None:
+        self.samples: list[int] = []
+
+    def add(self, value: int) -> None:
+        self.samples.append(value)
+
+    def percentile(self, percent: float) -> float:
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index] / 1000
+
+    def summary(self) -> dict[str, float]:
+        if not self.samples:
+            return {"count": 0}
+        return {
+            "count": len(self.samples),
+            "p50": round(self.percentile(50), 1),
+            "p99": round(self.percentile(99), 1),
+            "max": round(max(self.samples) / 1000, 1),
+        }
+
+
+class Recorder:
+    """
+    Collects input-to-commit latency, frame times and CPU time per event.
+    """
+
+    def __init__(self) -> None:
+        self.latency: dict[str, Stats] = {kind: Stats() for kind in EVENT_KINDS}
+        self.cpu: dict[str, Stats] = {kind: Stats() for kind in EVENT_KINDS}
+        self.frame_time = Stats()
+        self.frame_cpu = Stats()
+
+        # Events waiting for the next committed frame.
+        self.pending: list[tuple[str, int]] = []
+        # Map/unmap commands sent to clients, waiting for the compositor to see them.
+        self.pending_commands: dict[str, deque[int]] = {
+            "map": deque(),
+            "unmap": deque(),
+        }
+
+    def event(self, kind: str, injected: int, cpu: int) -> None:
+        self.pending.append((kind, injected))
+        self.cpu[kind].add(cpu)
+
+    def command(self, kind: str) -> None:
+        self.pending_commands[kind].append(time.perf_counter_ns())
+
+    def command_handled(self, kind: str, cpu: int) -> None:
+        self.cpu[kind].add(cpu)
+        if self.pending_commands[kind]:
+            self.pending.append((kind, self.pending_commands[kind].popleft()))
+
+    def frame(self, start: int, end: int, cpu: int, committed: bool) -> None:
+        self.frame_time.add(end - start)
+        self.frame_cpu.add(cpu)
+        # Held, skipped or failed frames showed nothing new on screen.
+        if not committed:
+            return
+        for kind, injected in self.pending:
+            self.latency[kind].add(end - injected)
+        self.pending.clear()
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "latency_us": {k: v.summary() for k, v in self.latency.items()},
+            "cpu_us": {k: v.summary() for k, v in self.cpu.items()},
+            "frame_time_us": self.frame_time.summary(),
+            "frame_cpu_us": self.frame_cpu.summary(),
+            "uncommitted_events": len(self.pending),
+        }
+
+
+def build_script(events: int, clients: int, seed: int) -> list[Step]:
+    """
+    A reproducible mix of pointer, key and map/unmap events.
+    """
+    rng = random.Random(seed)
+    unmapped: set[int] = set()
+    script: list[Step] = []
+    for _ in range(events):
+        roll = rng.random()
+        if roll < 0.6:
+            script.append(("motion", rng.randint(-20, 20), rng.randint(-20, 20)))
+        elif roll < 0.9:
+            script.append(("key", rng.choice(TYPED_KEYS), 0))
+        elif roll < 0.95 or not clients:
+            script.append(("button", BTN_LEFT, 0))
+        else:
+            client = rng.randrange(clients)
+            if client in unmapped:
+                unmapped.remove(client)
+                script.append(("map", client, 0))
+            else:
+                unmapped.add(client)
+                script.append(("unmap", client, 0))
+    return script
+
+
+class Benchmark:
+    """
+    Drives NextCore on the headless backend with synthetic clients and input.
+    """
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.recorder = Recorder()
+        self.script = build_script(args.events, args.clients, args.seed)
+        self.step = 0
+        self.finished = False
+        self.clients: list[subprocess.Popen] = []
+        self.patched: list[tuple[type, str, Callable]] = []
+        self.timer: EventSource | None = None
+        self.deadline = 0.0
+
+        # Software rendering, no GPU required.
+        os.environ["WLR_RENDERER"] = "pixman"
+        self.instrument()
+
+        self.core = NextCore(
+            BackendType.HEADLESS,
+            args.coalesce_motion,
+            max_render_time=args.max_render_time,
+        )
+        backend = self.core.backend._ptr
+        for _ in range(args.outputs):
+            lib.wlr_headless_add_output(backend, args.width, args.height)
+        self.keyboard = lib.wlr_headless_add_input_device(
+            backend, lib.WLR_INPUT_DEVICE_KEYBOARD
+        )
+        self.pointer = lib.wlr_headless_add_input_device(
+            backend, lib.WLR_INPUT_DEVICE_POINTER
+        )
+
+    def patch(self, cls: type, name: str, wrapper: Callable) -> None:
+        original = getattr(cls, name)
+        self.patched.append((cls, name, original))
+        setattr(cls, name, wrapper(original))
+
+    def instrument(self) -> None:
+        """
+        Wrap the listeners we measure before any of them get registered.
+        """
+        recorder = self.recorder
+
+        def frame(original: Callable) -> Callable:
+            def render(output: NextOutput) -> None:
+                frames = output.frames_rendered
+                cpu = time.thread_time_ns()
+                start = time.perf_counter_ns()
+                original(output)
+                end = time.perf_counter_ns()
+                committed = output.frames_rendered != frames
+                recorder.frame(start, end, time.thread_time_ns() - cpu, committed)
+
+            return render
+
+        def command(kind: str) -> Callable:
+            def wrap(original: Callable) -> Callable:
+                def _on_event(window: XdgWindow, listener: Any, data: Any) -> None:
+                    cpu = time.thread_time_ns()
+                    original(window, listener, data)
+                    recorder.command_handled(kind, time.thread_time_ns() - cpu)
+
+                return _on_event
+
+            return wrap
+
+        self.patch(NextOutput, "render", frame)
+        self.patch(XdgWindow, "_on_map", command("map"))
+        self.patch(XdgWindow, "_on_unmap", command("unmap"))
+
+    def restore(self) -> None:
+        for cls, name, original in reversed(self.patched):
+            setattr(cls, name, original)
+        self.patched.clear()
+
+    def spawn_clients(self) -> None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for _ in range(self.args.clients):
+            self.clients.append(
+                subprocess.Popen(
+                    [sys.executable, "-m", "libnext.benchmark_client"],
+                    stdin=subprocess.PIPE,
+                    cwd=root,
+                    env=os.environ.copy(),
+                )
+            )
+
+    def send(self, client: int, command: str) -> None:
+        stdin = self.clients[client].stdin
+        assert stdin is not None
+        stdin.write(f"{command}\n".encode())
+        stdin.flush()
+
+    def inject(self, kind: str, a: int, b: int) -> None:
+        msec = time.monotonic_ns() // 1_000_000 & 0xFFFFFFFF
+        injected = time.perf_counter_ns()
+        cpu = time.thread_time_ns()
+        match kind:
+            case "motion":
+                # A burst of small motion events, like a high polling rate mouse.
+                burst = self.args.pointer_burst
+                for _ in range(burst):
+                    next_lib.next_headless_pointer_motion(
+                        self.pointer, msec, a / burst, b / burst
+                    )
+                    next_lib.next_headless_pointer_frame(self.pointer)
+            case "button":
+                next_lib.next_headless_pointer_button(self.pointer, msec, a, True)
+                next_lib.next_headless_pointer_frame(self.pointer)
+                next_lib.next_headless_pointer_button(self.pointer, msec, a, False)
+                next_lib.next_headless_pointer_frame(self.pointer)
+            case "key":
+                next_lib.next_headless_keyboard_key(self.keyboard, msec, a, True)
+                next_lib.next_headless_keyboard_key(self.keyboard, msec, a, False)
+            case "map" | "unmap":
+                self.recorder.command(kind)
+                self.send(a, kind)
+                return
+        self.recorder.event(kind, injected, time.thread_time_ns() - cpu)
+
+    def _on_timer(self, _data: Any) -> int:
+        assert self.timer is not None
+        if self.step == 0 and len(self.core.mapped_windows) < self.args.clients:
+            if time.monotonic() < self.deadline:
+                self.timer.timer_update(10)
+                return 0
+            log.warning(
+                "Only %d of %d clients mapped, starting anyway.",
+                len(self.core.mapped_windows),
+                self.args.clients,
+            )
+
+        if self.step < len(self.script):
+            self.inject(*self.script[self.step])
+            self.step += 1
+            self.timer.timer_update(self.args.interval)
+        elif not self.finished:
+            # Let the last events reach a frame before stopping.
+            self.finished = True
+            self.timer.timer_update(self.args.settle)
+        else:
+            self.core.display.terminate()
+        return 0
+
+    def run(self) -> dict[str, Any]:
+        try:
+            self.core.start()
+            self.spawn_clients()
+            self.deadline = time.monotonic() + self.args.startup_timeout
+            self.timer = self.core.event_loop.add_timer(self._on_timer)
+            self.timer.timer_update(10)
+            self.core.display.run()
+        finally:
+            for client in self.clients:
+                if client.stdin:
+                    client.stdin.close()
+            for client in self.clients:
+                try:
+                    client.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    client.kill()
+            if self.timer is not None:
+                self.timer.remove()
+            self.core.destroy()
+            self.restore()
+
+        report = self.recorder.report()
+        report["metrics"] = self.core.metrics.snapshot()
+        report["config"] = {
+            "clients": self.args.clients,
+            "outputs": self.args.outputs,
+            "events": self.args.events,
+            "interval_ms": self.args.interval,
+            "pointer_burst": self.args.pointer_burst,
+            "coalesce_motion": self.args.coalesce_motion,
+            "max_render_time": self.args.max_render_time,
+            "seed": self.args.seed,
+        }
+        return report
+
+
+def format_report(report: dict[str, Any]) -> str:
+    lines = [
+        "{:<22}{:>8}{:>12}{:>12}{:>12}".format(
+            "metric", "count", "p50 us", "p99 us", "max us"
+        )
+    ]
+    rows: list[tuple[str, dict[str, float]]] = []
+    rows += [(f"latency/{k}", v) for k, v in report["latency_us"].items()]
+    rows += [(f"cpu/{k}", v) for k, v in report["cpu_us"].items()]
+    rows += [
+        ("frame/time", report["frame_time_us"]),
+        ("frame/cpu", report["frame_cpu_us"]),
+    ]
+    for name, summary in rows:
+        if not summary["count"]:
+            continue
+        lines.append(
+            "{:<22}{:>8}{:>12}{:>12}{:>12}".format(
+                name, summary["count"], summary["p50"], summary["p99"], summary["max"]
+            )
+        )
+    lines.append(f"uncommitted events: {report['uncommitted_events']}")
+    for name, value in report["metrics"].items():
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines)
+
+
+def compare(
+    report: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """
+    Returns the p99 metrics that regressed by more than tolerance.
+    """
+    regressions = []
+    for section in ("latency_us", "cpu_us"):
+        for kind, summary in report[section].items():
+            old = baseline.get(section, {}).get(kind, {})
+            if summary["count"] and old.get("count"):
+                if summary["p99"] > old["p99"] * (1 + tolerance):
+                    regressions.append(
+                        f"{section}/{kind}: {old['p99']} -> {summary['p99']}"
+                    )
+    for section in ("frame_time_us", "frame_cpu_us"):
+        old = baseline.get(section, {})
+        summary = report[section]
+        if summary["count"] and old.get("count"):
+            if summary["p99"] > old["p99"] * (1 + tolerance):
+                regressions.append(f"{section}: {old['p99']} -> {summary['p99']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="NextWM headless benchmark - synthetic clients and input."
+    )
+    parser.add_argument(
+        "--clients", type=int, default=4, help="synthetic xdg_shell clients"
+    )
+    parser.add_argument("--outputs", type=int, default=1, help="headless outputs")
+    parser.add_argument("--width", type=int, default=1920, help="output width")
+    parser.add_argument("--height", type=int, default=1080, help="output height")
+    parser.add_argument(
+        "--events", type=int, default=2000, help="scripted events to replay"
+    )
+    parser.add_argument("--interval", type=int, default=2, help="ms between events")
+    parser.add_argument("--seed", type=int, default=0, help="script seed")
+    parser.add_argument(
+        "--pointer-burst",
+        type=int,
+        default=1,
+        help="motion events per scripted motion step, simulates high-rate mice",
+    )
+    parser.add_argument(
+        "--coalesce-motion",
+        action="store_true",
+        help="run the compositor with pointer motion coalescing",
+    )
+    parser.add_argument(
+        "--max-render-time",
+        type=parse_max_render_time,
+        default=None,
+        help="render delay in ms before vblank, 'auto' or 'off'",
+    )
+    parser.add_argument(
+        "--settle", type=int, default=500, help="ms to wait after the last event"
+    )
+    parser.add_argument(
+        "--startup-timeout",
+        type=float,
+        default=10.0,
+        help="seconds to wait for clients to map",
+    )
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare p99 values against this report")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed p99 regression ratio"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = Benchmark(args).run()
+    print(format_report(report))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import mmap
+import os
+import select
+import sys
+from typing import Any
+
+from pywayland.client import Display
+from pywayland.protocol.wayland import WlCompositor, WlSeat, WlShm
+from pywayland.protocol.xdg_shell import XdgWmBase
+
+# Large enough for any buffer size the compositor configures us with.
+MAX_WIDTH = 3840
+MAX_HEIGHT = 2160
+STRIDE = MAX_WIDTH * 4
+
+
+class SyntheticClient:
+    """
+    Minimal xdg_shell client used by the benchmark harness.
+
+    It redraws on every key and pointer event it receives so that input
+    results in a surface commit, and maps or unmaps its toplevel when told to
+    on stdin ("map", "unmap" or "quit", one per line).
+    """
+
+    def __init__(self) -> None:
+        self.display = Display()
+        self.display.connect()
+
+        self.compositor: Any = None
+        self.shm: Any = None
+        self.wm_base: Any = None
+        self.seat: Any = None
+        self.keyboard: Any = None
+        self.pointer: Any = None
+
+        registry = self.display.get_registry()
+        registry.dispatcher["global"] = self._on_global
+        self.display.roundtrip()
+
+        if self.compositor is None or self.shm is None or self.wm_base is None:
+            raise RuntimeError("Compositor is missing a required global")
+
+        fd = os.memfd_create("next-benchmark-client")
+        os.ftruncate(fd, STRIDE * MAX_HEIGHT)
+        self.pool_data = mmap.mmap(fd, STRIDE * MAX_HEIGHT)
+        self.pool_data.write(b"\x33\x33\x33\xff" * MAX_WIDTH * MAX_HEIGHT)
+        self.pool = self.shm.create_pool(fd, STRIDE * MAX_HEIGHT)
+        os.close(fd)
+
+        self.buffers: dict[tuple[int, int], Any] = {}
+        self.width = 640
+        self.height = 480
+
+        self.surface: Any = None
+        self.xdg_surface: Any = None
+        self.toplevel: Any = None
+        self.mapped = False
+        self.want_mapped = False
+        self.running = True
+
+    def _on_global(self, registry, name: int, interface: str, version: int) -> None:
+        if interface == "wl_compositor":
+            self.compositor = registry.bind(name, WlCompositor, min(version, 4))
+        elif interface == "wl_shm":
+            self.shm = registry.bind(name, WlShm, 1)
+        elif interface == "xdg_wm_base":
+            self.wm_base = registry.bind(name, XdgWmBase, 1)
+            self.wm_base.dispatcher["ping"] = self._on_ping
+        elif interface == "wl_seat" and self.seat is None:
+            self.seat = registry.bind(name, WlSeat, min(version, 5))
+            self.seat.dispatcher["capabilities"] = self._on_capabilities
+
+    def _on_ping(self, wm_base, serial: int) -> None:
+        wm_base.pong(serial)
+
+    def _on_capabilities(self, seat, capabilities: int) -> None:
+        if capabilities & WlSeat.capability.keyboard and self.keyboard is None:
+            self.keyboard = seat.get_keyboard()
+            self.keyboard.dispatcher["keymap"] = self._on_keymap
+            self.keyboard.dispatcher["key"] = self._on_input
+        if capabilities & WlSeat.capability.pointer and self.pointer is None:
+            self.pointer = seat.get_pointer()
+            self.pointer.dispatcher["motion"] = self._on_input
+            self.pointer.dispatcher["button"] = self._on_input
+
+    def _on_keymap(self, _keyboard, _format: int, fd: int, _size: int) -> None:
+        os.close(fd)
+
+    def _on_input(self, *_args) -> None:
+        self.draw()
+
+    def _on_configure(self, xdg_surface, serial: int) -> None:
+        xdg_surface.ack_configure(serial)
+        if self.want_mapped:
+            self.mapped = True
+            self.draw()
+
+    def _on_toplevel_configure(
+        self, _toplevel, width: int, height: int, _states
+    ) -> None:
+        if width > 0 and height > 0:
+            self.width = min(width, MAX_WIDTH)
+            self.height = min(height, MAX_HEIGHT)
+
+    def _on_toplevel_close(self, _toplevel) -> None:
+        self.running = False
+
+    def get_buffer(self) -> Any:
+        size = (self.width, self.height)
+        if size not in self.buffers:
+            self.buffers[size] = self.pool.create_buffer(
+                0, self.width, self.height, STRIDE, WlShm.format.argb8888
+            )
+        return self.buffers[size]
+
+    def draw(self) -> None:
+        if not self.mapped:
+            return
+        self.surface.attach(self.get_buffer(), 0, 0)
+        self.surface.damage(0, 0, self.width, self.height)
+        self.surface.commit()
+
+    def map(self) -> None:
+        if self.surface is None:
+            self.surface = self.compositor.create_surface()
+            self.xdg_surface = self.wm_base.get_xdg_surface(self.surface)
+            self.xdg_surface.dispatcher["configure"] = self._on_configure
+            self.toplevel = self.xdg_surface.get_toplevel()
+            self.toplevel.dispatcher["configure"] = self._on_toplevel_configure
+            self.toplevel.dispatcher["close"] = self._on_toplevel_close
+            self.toplevel.set_title("next-benchmark")
+            self.toplevel.set_app_id("next-benchmark")
+        self.want_mapped = True
+        # The initial commit without a buffer asks the compositor for a configure.
+        self.surface.commit()
+
+    def unmap(self) -> None:
+        if self.surface is None:
+            return
+        self.mapped = self.want_mapped = False
+        self.surface.attach(None, 0, 0)
+        self.surface.commit()
+
+    def handle_command(self, command: str) -> None:
+        match command:
+            case "map":
+                self.map()
+            case "unmap":
+                self.unmap()
+            case "quit":
+                self.running = False
+
+    def run(self) -> None:
+        self.map()
+        fd = self.display.get_fd()
+        stdin = sys.stdin.fileno()
+        pending = ""
+        while self.running:
+            self.display.flush()
+            readable, _, _ = select.select([fd, stdin], [], [])
+            if fd in readable and self.display.dispatch(block=True) == -1:
+                break
+            if stdin in readable:
+                data = os.read(stdin, 4096).decode()
+                if not data:
+                    break
+                pending += data
+                *commands, pending = pending.split("\n")
+                for command in commands:
+                    self.handle_command(command.strip())
+        self.display.disconnect()
+
+
+def main() -> None:
+    SyntheticClient().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from wlroots import ffi, lib
+from wlroots.wlr_types import SceneNode
+
+from libnext._wlroots import lib as next_lib
+
+
+class Borders:
+    """
+    Server side borders: four scene rects around the surface, children of
+    the window's scene tree.
+
+    wlroots is only called when the size, border width or color changes.
+    """
+
+    def __init__(self, parent: SceneNode, color: ffi.CData) -> None:
+        self.rects = [
+            next_lib.wlr_scene_rect_create(parent._ptr, 0, 0, color) for _ in range(4)
+        ]
+        self.nodes = [next_lib.next_scene_rect_node(rect) for rect in self.rects]
+        self.geometry: tuple[int, int, int] = (0, 0, 0)
+        self.color = color
+
+    def set_geometry(self, width: int, height: int, border_width: int) -> None:
+        """
+        Fit the borders to a window of the given outer size.
+        """
+        geometry = (width, height, border_width)
+        if geometry == self.geometry:
+            return
+        self.geometry = geometry
+
+        inner_height = max(height - 2 * border_width, 0)
+        boxes = (
+            (0, 0, width, border_width),
+            (0, height - border_width, width, border_width),
+            (0, border_width, border_width, inner_height),
+            (width - border_width, border_width, border_width, inner_height),
+        )
+        for rect, node, (x, y, box_width, box_height) in zip(
+            self.rects, self.nodes, boxes
+        ):
+            next_lib.wlr_scene_rect_set_size(rect, box_width, box_height)
+            lib.wlr_scene_node_set_position(node, x, y)
+
+    def set_color(self, color: ffi.CData) -> None:
+        # Colors come from util.color(), equal colors are the same cdata.
+        if color is self.color:
+            return
+        self.color = color
+        for rect in self.rects:
+            next_lib.wlr_scene_rect_set_color(rect, color)
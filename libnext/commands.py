@@ -0,0 +1,324 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import json
+import logging
+import subprocess
+from typing import Any, Callable
+
+from libnext import keybindings, util
+from libnext.metrics import listener_metrics
+
+log = logging.getLogger("Next: Commands")
+
+# Commands are called with NextCore and their arguments, what they return is
+# sent back to the client.
+Command = Callable[[Any, list[str]], str]
+
+# libwayland disconnects clients sent a message over 4096 bytes, replies stay
+# below that with room for the message header.
+REPLY_SIZE_LIMIT = 4000
+# Titles and classes are cut so one window always fits in a reply.
+NAME_LIMIT = 256
+
+
+class CommandError(Exception):
+    """
+    A command couldn't be carried out, the message is sent to the client.
+    """
+
+
+def run_command(core, args: list[str]) -> str:
+    """
+    Look up and run a command, raises CommandError when it fails.
+    """
+    if not args:
+        raise CommandError("No command given")
+
+    command = COMMANDS.get(args[0])
+    if command is None:
+        raise CommandError(f"Unknown command: {args[0]}")
+    return command(core, args[1:])
+
+
+# Argument helpers
+def expect_args(args: list[str], minimum: int, maximum: int) -> None:
+    if len(args) < minimum:
+        raise CommandError("Not enough arguments")
+    if len(args) > maximum:
+        raise CommandError("Too many arguments")
+
+
+def parse_int(arg: str, minimum: int = 0) -> int:
+    try:
+        value = int(arg, 0)
+    except ValueError:
+        raise CommandError(f"Not a number: {arg}")
+    if value < minimum:
+        raise CommandError(f"Must be at least {minimum}: {arg}")
+    return value
+
+
+def parse_color(arg: str) -> Any:
+    try:
+        return util.color(arg)
+    except ValueError:
+        raise CommandError(f"Invalid color: {arg}")
+
+
+def find_window(core, arg: str | None):
+    """
+    The window with the given id, or the focused one without an id.
+    """
+    if arg is None:
+        window = core.focus.focused
+        if window is None:
+            raise CommandError("No focused window")
+        return window
+
+    wid = parse_int(arg)
+    for window in core.mapped_windows:
+        if window.wid == wid:
+            return window
+    raise CommandError(f"No window with id {wid}")
+
+
+def find_output(core, arg: str | None):
+    """
+    An output by name, "next" and "previous" are relative to the focused one.
+    Without a name it's the focused output.
+    """
+    current = keybindings.focused_output(core)
+    if arg is None or arg in ("next", "previous"):
+        if current is None:
+            raise CommandError("No output")
+        if arg is None:
+            return current
+        step = 1 if arg == "next" else -1
+        index = core.outputs.index(current) if current in core.outputs else 0
+        return core.outputs[(index + step) % len(core.outputs)]
+
+    for output in core.outputs:
+        if output.wlr_output.name == arg:
+            return output
+    raise CommandError(f"No output named {arg}")
+
+
+def describe_window(window) -> dict:
+    return {
+        "id": window.wid,
+        "title": window.name[:NAME_LIMIT],
+        "class": window.wm_class[:NAME_LIMIT] if window.wm_class else None,
+        "output": window.output.wlr_output.name if window.output else None,
+        "tags": window.tags,
+        "geometry": [window.x, window.y, window.width, window.height],
+        "visible": window.enabled,
+        "focused": window.activated,
+        "fullscreen": window.fullscreen,
+    }
+
+
+# Commands
+def focus(core, args: list[str]) -> str:
+    expect_args(args, 1, 1)
+    if args[0] == "next":
+        keybindings.focus_next(core)
+    elif args[0] == "previous":
+        keybindings.focus_previous(core)
+    else:
+        core.focus_window(find_window(core, args[0]))
+    return ""
+
+
+def close(core, args: list[str]) -> str:
+    expect_args(args, 0, 1)
+    find_window(core, args[0] if args else None).kill()
+    return ""
+
+
+def spawn(_core, args: list[str]) -> str:
+    expect_args(args, 1, 1)
+    subprocess.Popen(["/bin/sh", "-c", args[0]])
+    return ""
+
+
+def move_to_output(core, args: list[str]) -> str:
+    expect_args(args, 1, 2)
+    output = find_output(core, args[0])
+    window = find_window(core, args[1] if len(args) > 1 else None)
+    source = window.output
+    if output is source:
+        return ""
+
+    if source is not None:
+        window.set_fullscreen(False)
+        source.remove_window(window)
+        source.arrange()
+    window.output = output
+    window.tags = output.tags
+    output.add_window(window)
+    output.arrange()
+    return ""
+
+
+def set_tags(core, args: list[str]) -> str:
+    expect_args(args, 1, 2)
+    tags = parse_int(args[0], 1)
+    find_output(core, args[1] if len(args) > 1 else None).set_tags(tags)
+    return ""
+
+
+def set_window_tags(core, args: list[str]) -> str:
+    expect_args(args, 1, 2)
+    tags = parse_int(args[0], 1)
+    window = find_window(core, args[1] if len(args) > 1 else None)
+    if window.output is not None:
+        window.output.set_window_tags(window, tags)
+    return ""
+
+
+def set_layout(core, args: list[str]) -> str:
+    expect_args(args, 1, 2)
+    output = find_output(core, args[1] if len(args) > 1 else None)
+    core.layout_manager.set_layout(output, args[0])
+    return ""
+
+
+def set_border(core, args: list[str]) -> str:
+    expect_args(args, 1, 3)
+    width = parse_int(args[0])
+    if len(args) > 1:
+        core.border_color_focused = parse_color(args[1])
+    if len(args) > 2:
+        core.border_color_normal = parse_color(args[2])
+
+    core.border_width = width
+    for window in core.mapped_windows:
+        if window.bordercolor_spec is None:
+            window.bordercolor = [core.border_color_normal]
+        window.update_border_color()
+    for output in core.outputs:
+        output.arrange()
+    return ""
+
+
+def list_windows(core, args: list[str]) -> str:
+    """
+    As many windows as fit in a reply, from the given index on. "next" is the
+    index to ask for to get the rest, null once all were sent.
+    """
+    expect_args(args, 0, 1)
+    start = parse_int(args[0]) if args else 0
+    windows = list(core.mapped_windows)[start:]
+
+    # Room for the object around the list.
+    size = 64
+    page = []
+    for window in windows:
+        description = describe_window(window)
+        size += len(json.dumps(description)) + 2
+        if size > REPLY_SIZE_LIMIT:
+            break
+        page.append(description)
+
+    end = start + len(page)
+    next_start = end if len(page) < len(windows) else None
+    return json.dumps({"windows": page, "next": next_start})
+
+
+def list_outputs(core, args: list[str]) -> str:
+    expect_args(args, 0, 0)
+    return json.dumps(
+        [
+            {
+                "name": output.wlr_output.name,
+                "geometry": list(output.geometry),
+                "usable_area": list(output.usable_area),
+                "scale": output.scale,
+                "tags": output.tags,
+                "layout": output.active_layout_namespace,
+                "adaptive_sync": output.adaptive_sync,
+            }
+            for output in core.outputs
+        ]
+    )
+
+
+def frame_timings(core, args: list[str]) -> str:
+    expect_args(args, 0, 1)
+    outputs = [find_output(core, args[0])] if args else core.outputs
+    return json.dumps(
+        {output.wlr_output.name: output.frame_timings.snapshot() for output in outputs}
+    )
+
+
+def adaptive_sync(core, args: list[str]) -> str:
+    expect_args(args, 1, 2)
+    if args[0] not in ("on", "off"):
+        raise CommandError("Expected on or off")
+    output = find_output(core, args[1] if len(args) > 1 else None)
+    if not output.set_adaptive_sync(args[0] == "on"):
+        raise CommandError(f"{output.wlr_output.name} refused adaptive sync")
+    return ""
+
+
+def metrics(core, args: list[str]) -> str:
+    expect_args(args, 0, 1)
+    if not args:
+        return core.dump_metrics()
+    if args[0] != "reset":
+        raise CommandError("Expected reset")
+    core.metrics.reset()
+    listener_metrics.reset()
+    return ""
+
+
+def profile(core, args: list[str]) -> str:
+    expect_args(args, 1, 2)
+    if args[0] == "start":
+        core.profiler.start(parse_int(args[1], 1) if len(args) > 1 else 1)
+        return ""
+    if args[0] == "stop":
+        core.profiler.stop()
+        return core.dump_profile(parse_int(args[1], 1) if len(args) > 1 else 50)
+    raise CommandError("Expected start or stop")
+
+
+COMMANDS: dict[str, Command] = {
+    "focus": focus,
+    "close": close,
+    "spawn": spawn,
+    "move-to-output": move_to_output,
+    "set-tags": set_tags,
+    "set-window-tags": set_window_tags,
+    "set-layout": set_layout,
+    "set-border": set_border,
+    "list-windows": list_windows,
+    "list-outputs": list_outputs,
+    "frame-timings": frame_timings,
+    "adaptive-sync": adaptive_sync,
+    "metrics": metrics,
+    "profile": profile,
+}
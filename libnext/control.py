@@ -22,21 +22,183 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
 # EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+
+import json
 import logging
+from collections import deque
+from typing import Any
 
-# TODO: Figure out why this breaks mypy.
-from pywayland.protocol.next_control_v1 import NextControlV1  # ignore: type
 from pywayland.protocol_core.globals import Global
-from pywayland.server import Display
+from pywayland.protocol_core.resource import Resource
+
+from libnext._protocols.next_control_v1 import NextControlV1
+from libnext.commands import (
+    REPLY_SIZE_LIMIT,
+    CommandError,
+    describe_window,
+    run_command,
+)
+from libnext.metrics import Metric
+from libnext.resources import setup_resource
 
 log = logging.getLogger("Next: Control")
 
+# Events kept for a watching client until it asks for them, older ones are
+# dropped.
+WATCH_QUEUE_SIZE = 256
+
+
+class Watcher:
+    """
+    A client streaming events with the watch command.
+    """
+
+    def __init__(self) -> None:
+        self.events: deque[str] = deque(maxlen=WATCH_QUEUE_SIZE)
+        # The watch callback waiting for the next event.
+        self.callback: Resource | None = None
+
+    def flush(self) -> None:
+        """
+        Answer the waiting watch command with the queued events, one JSON
+        object per line. Only as many as fit in one reply are sent, the rest
+        go out with the next watch.
+        """
+        callback = self.callback
+        if callback is None or not self.events:
+            return
+        self.callback = None
+
+        lines = [self.events.popleft()]
+        size = len(lines[0])
+        while self.events and size + len(self.events[0]) + 1 <= REPLY_SIZE_LIMIT:
+            line = self.events.popleft()
+            size += len(line) + 1
+            lines.append(line)
+        callback.success("\n".join(lines))
+        callback.destroy()
+
 
 class Control(Global):
-    def __init__(self, display: Display) -> None:
+    """
+    Server side of next_control_v1.
+
+    Clients build a command with add_argument and run it with run_command,
+    the result goes to the callback object. Commands that arrive together,
+    like a script pipelining many run_command requests in one flush, form a
+    batch: outputs they touch are arranged once, in an idle callback after
+    the last one, instead of once per command.
+
+    The watch command streams window, focus and tag events. Its callback is
+    answered with the events that happened since the previous watch, the
+    client sends the next watch to keep going.
+    """
+
+    def __init__(self, core) -> None:
+        self.core = core
         self.interface = NextControlV1
-        super().__init__(display, 1)
-        log.info("Created next_control_v1 global")
+        super().__init__(core.display, 1)
+        self.bind_func = self._on_bind
+        # Arguments sent so far per next_control_v1 object.
+        self.arguments: dict[Resource, list[str]] = {}
+        # Outputs waiting to be arranged while a batch is open, see
+        # NextOutput.arrange().
+        self.arrange_batch: set | None = None
+        self.watchers: dict[Resource, Watcher] = {}
+        # pywayland doesn't keep resources alive, we hold them until destroyed.
+        self.resources: set[Resource] = set()
+        log.debug("Created next_control_v1 global")
 
     def destroy(self) -> None:
+        self.arguments.clear()
+        self.watchers.clear()
+        self.resources.clear()
         super().destroy()
+
+    def emit(self, event: str, window: Any = None, output: Any = None) -> None:
+        """
+        Send an event to watching clients, free when nobody watches.
+        """
+        if not self.watchers:
+            return
+
+        data: dict[str, Any] = {"event": event}
+        if window is not None:
+            data["window"] = describe_window(window)
+        if output is not None:
+            data["output"] = output.wlr_output.name
+            data["tags"] = output.tags
+        line = json.dumps(data)
+        if len(line) > REPLY_SIZE_LIMIT:
+            log.error("Dropping %s event too large to send", event)
+            return
+        for watcher in self.watchers.values():
+            watcher.events.append(line)
+            watcher.flush()
+
+    def watch(self, resource: Resource, callback: Resource) -> None:
+        watcher = self.watchers.get(resource)
+        if watcher is None:
+            watcher = self.watchers[resource] = Watcher()
+        elif watcher.callback is not None:
+            callback.failure("Already watching")
+            callback.destroy()
+            return
+        watcher.callback = callback
+        watcher.flush()
+
+    def _on_bind(self, resource: Resource) -> None:
+        setup_resource(resource, self._on_resource_destroy)
+        self.resources.add(resource)
+        self.arguments[resource] = []
+        resource.dispatcher["add_argument"] = self._on_add_argument
+        resource.dispatcher["run_command"] = self._on_run_command
+
+    def _on_resource_destroy(self, resource: Resource) -> None:
+        self.resources.discard(resource)
+        self.arguments.pop(resource, None)
+        watcher = self.watchers.pop(resource, None)
+        if watcher is not None and watcher.callback is not None:
+            if watcher.callback._ptr is not None:
+                watcher.callback.destroy()
+
+    def _on_add_argument(self, resource: Resource, argument: str) -> None:
+        self.arguments[resource].append(argument)
+
+    def _on_run_command(
+        self, resource: Resource, _seat: Any, callback: Resource
+    ) -> None:
+        setup_resource(callback)
+        args = self.arguments[resource]
+        self.arguments[resource] = []
+        if args == ["watch"]:
+            self.watch(resource, callback)
+            return
+
+        if self.arrange_batch is None:
+            self.arrange_batch = set()
+            self.core.event_loop.add_idle(self._on_batch_done)
+        self.core.metrics.incr(Metric.CONTROL_COMMANDS)
+
+        try:
+            output = run_command(self.core, args)
+        except CommandError as e:
+            callback.failure(str(e))
+        except Exception as e:
+            log.exception("Command %s failed", args)
+            callback.failure(f"Internal error: {e}")
+        else:
+            if len(output.encode()) > REPLY_SIZE_LIMIT:
+                log.error("Reply to %s is too large to send", args)
+                callback.failure("Reply too large")
+            else:
+                callback.success(output)
+        # The callback is destroyed by the compositor once answered.
+        callback.destroy()
+
+    def _on_batch_done(self, _data: Any) -> None:
+        batch, self.arrange_batch = self.arrange_batch, None
+        self.core.metrics.incr(Metric.CONTROL_BATCHES)
+        for output in batch or ():
+            if output in self.core.outputs:
+                output.arrange()
@@ -0,0 +1,132 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import json
+from typing import Any, Iterator
+
+from pywayland.client import Display
+from pywayland.protocol.wayland import WlSeat
+
+from libnext._protocols.next_control_v1 import NextControlV1
+
+
+class CommandResult:
+    """
+    The answer to one command, filled in when its callback fires.
+    """
+
+    def __init__(self, args: list[str]) -> None:
+        self.args = args
+        self.done: bool = False
+        self.success: bool = False
+        self.output: str = ""
+
+    def _on_success(self, _callback, output: str) -> None:
+        self.done = self.success = True
+        self.output = output
+
+    def _on_failure(self, _callback, failure_message: str) -> None:
+        self.done = True
+        self.output = failure_message
+
+
+class ControlClient:
+    """
+    A connection to the compositor's next_control_v1 global.
+
+    Commands are only queued by queue(), roundtrip() sends everything queued
+    so far in one flush and waits until every command is answered.
+    """
+
+    def __init__(self, display_name: str | None = None) -> None:
+        self.display = Display(display_name)
+        self.display.connect()
+
+        self.control: Any = None
+        self.seat: Any = None
+        registry = self.display.get_registry()
+        registry.dispatcher["global"] = self._on_global
+        self.display.roundtrip()
+
+        if self.control is None:
+            raise RuntimeError("Compositor doesn't support next_control_v1")
+        if self.seat is None:
+            raise RuntimeError("Compositor has no seat")
+
+    def disconnect(self) -> None:
+        self.display.disconnect()
+
+    def _on_global(self, registry, name: int, interface: str, version: int) -> None:
+        if interface == "next_control_v1":
+            self.control = registry.bind(name, NextControlV1, 1)
+        elif interface == "wl_seat" and self.seat is None:
+            self.seat = registry.bind(name, WlSeat, 1)
+
+    def queue(self, args: list[str]) -> CommandResult:
+        result = CommandResult(args)
+        for arg in args:
+            self.control.add_argument(arg)
+        callback = self.control.run_command(self.seat)
+        callback.dispatcher["success"] = result._on_success
+        callback.dispatcher["failure"] = result._on_failure
+        return result
+
+    def roundtrip(self) -> None:
+        self.display.roundtrip()
+
+    def run(self, args: list[str]) -> CommandResult:
+        result = self.queue(args)
+        self.roundtrip()
+        return result
+
+    def list_windows(self) -> list[dict]:
+        """
+        Every window, list-windows only answers with as many as fit in one
+        message.
+        """
+        windows: list[dict] = []
+        start: int | None = 0
+        while start is not None:
+            result = self.run(["list-windows", str(start)])
+            if not result.success:
+                raise RuntimeError(result.output)
+            page = json.loads(result.output)
+            windows.extend(page["windows"])
+            start = page["next"]
+        return windows
+
+    def watch(self) -> Iterator[str]:
+        """
+        Yield events as JSON lines until the connection goes away.
+        """
+        while True:
+            result = self.queue(["watch"])
+            self.display.flush()
+            while not result.done:
+                if self.display.dispatch(block=True) == -1:
+                    return
+            if not result.success:
+                raise RuntimeError(result.output)
+            yield from result.output.split("\n")
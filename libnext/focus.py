@@ -0,0 +1,136 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import logging
+
+from wlroots.wlr_types import Surface
+
+from libnext.metrics import Metric
+from libnext.window import WindowType
+
+log = logging.getLogger("Next: Focus")
+
+
+class FocusManager:
+    """
+    Tracks the focused window so redundant focus requests never reach wlroots.
+
+    A focus change deactivates the previous window, raises and activates the
+    new one and sends keyboard enter, all in one transition.
+    """
+
+    def __init__(self, core) -> None:
+        self.core = core
+        self.focused: WindowType | None = None
+        self.focused_surface: Surface | None = None
+        # Layer surface holding keyboard focus, windows get it back once it
+        # lets go.
+        self.layer = None
+
+    def focus(self, window: WindowType | None, surface: Surface | None = None) -> None:
+        """
+        Give keyboard focus to a window, or clear it if window is None.
+        surface defaults to the main surface of the window.
+        """
+        seat = self.core.seat
+        if seat.destroyed:
+            return
+        if surface is None and window is not None:
+            surface = window.surface.surface
+
+        # Layer surfaces with on demand keyboard interactivity give focus up
+        # to windows, exclusive ones keep it until they let go.
+        layer = self.layer
+        if layer is not None and window is not None and not layer.exclusive_keyboard:
+            self.layer = None
+        elif window is self.focused and surface == self.focused_surface:
+            self.core.metrics.incr(Metric.FOCUS_SKIPPED)
+            return
+
+        previous = self.focused
+        self.focused = window
+        self.focused_surface = surface
+        self.core.metrics.incr(Metric.FOCUS_CHANGES)
+        if previous is not window:
+            self.core.control.emit("focus", window=window)
+
+        if previous is not None and previous is not window:
+            previous.activate(False)
+
+        if window is None:
+            if self.layer is None:
+                seat.keyboard_clear_focus()
+            return
+
+        if previous is not window:
+            window.scene_node.raise_to_top()
+            window.z_index = next(self.core.z_order)
+            self.core.mapped_windows.raise_to_top(window)
+            if window.output is not None:
+                window.output.raise_window(window)
+            window.activate(True)
+
+        if self.layer is None:
+            seat.keyboard_notify_enter(surface, seat.keyboard)
+
+    def focus_layer(self, layer) -> None:
+        """
+        Give keyboard focus to a layer surface, like a launcher or lock screen.
+        """
+        seat = self.core.seat
+        if seat.destroyed or layer is self.layer:
+            return
+        self.layer = layer
+        seat.keyboard_notify_enter(layer.layer_surface.surface, seat.keyboard)
+
+    def unfocus_layer(self, layer) -> None:
+        """
+        Hand keyboard focus back to the focused window.
+        """
+        if layer is not self.layer:
+            return
+        self.layer = None
+        self.restore()
+
+    def restore(self) -> None:
+        """
+        Send keyboard enter to the focused window again, after a surface
+        outside the window stack had it.
+        """
+        seat = self.core.seat
+        if seat.destroyed or self.layer is not None:
+            return
+        if self.focused_surface is None:
+            seat.keyboard_clear_focus()
+        else:
+            seat.keyboard_notify_enter(self.focused_surface, seat.keyboard)
+
+    def forget(self, window: WindowType) -> None:
+        """
+        Drop a window that's going away without touching its surface.
+        """
+        if window is self.focused:
+            self.focused = None
+            self.focused_surface = None
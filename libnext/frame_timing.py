@@ -0,0 +1,94 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from array import array
+from bisect import bisect_left
+
+# Upper bounds of the commit-to-present histogram buckets in microseconds,
+# the last bucket holds everything slower.
+LATENCY_BUCKETS_US = (1000, 2000, 4000, 8000, 12000, 16000, 25000, 33000, 50000)
+
+
+class FrameTimings:
+    """
+    Commit-to-present latency histogram and missed vblank count of one output,
+    fed by NextOutput from scene commits and wlr_output present events.
+    """
+
+    def __init__(self) -> None:
+        self.buckets = array("Q", bytes(8 * (len(LATENCY_BUCKETS_US) + 1)))
+        self.presented: int = 0
+        self.discarded: int = 0
+        self.missed_vblanks: int = 0
+        self.max_latency_us: int = 0
+        self.total_latency_us: int = 0
+        # Monotonic time of the last commit that hasn't been presented yet.
+        self.commit_ns: int | None = None
+
+    def committed(self, now_ns: int) -> None:
+        self.commit_ns = now_ns
+
+    def present(self, presented: bool, when_ns: int, refresh_ns: int) -> None:
+        """
+        Record a present event. A frame that took longer than a refresh
+        period to reach the screen missed one vblank per period over.
+        """
+        commit_ns, self.commit_ns = self.commit_ns, None
+        if not presented:
+            self.discarded += 1
+            return
+        self.presented += 1
+        if commit_ns is None or when_ns < commit_ns:
+            return
+
+        latency_ns = when_ns - commit_ns
+        latency_us = latency_ns // 1000
+        self.buckets[bisect_left(LATENCY_BUCKETS_US, latency_us)] += 1
+        self.total_latency_us += latency_us
+        self.max_latency_us = max(self.max_latency_us, latency_us)
+        if refresh_ns > 0:
+            self.missed_vblanks += latency_ns // refresh_ns
+
+    def reset(self) -> None:
+        for index in range(len(self.buckets)):
+            self.buckets[index] = 0
+        self.presented = self.discarded = self.missed_vblanks = 0
+        self.max_latency_us = self.total_latency_us = 0
+
+    def snapshot(self) -> dict:
+        histogram = {
+            "le_%d_us" % bound: count
+            for bound, count in zip(LATENCY_BUCKETS_US, self.buckets)
+        }
+        histogram["inf"] = self.buckets[-1]
+        measured = sum(self.buckets)
+        return {
+            "presented": self.presented,
+            "discarded": self.discarded,
+            "missed_vblanks": self.missed_vblanks,
+            "max_latency_us": self.max_latency_us,
+            "mean_latency_us": self.total_latency_us // measured if measured else 0,
+            "latency_histogram": histogram,
+        }
@@ -23,21 +23,24 @@
 # EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import logging
-import subprocess
 from typing import Any
 
 from pywayland.protocol.wayland import WlKeyboard
 from pywayland.server import Listener
 from wlroots import ffi, lib
 from wlroots.wlr_types import InputDevice
-from wlroots.wlr_types.keyboard import KeyboardKeyEvent, KeyboardModifier
+from wlroots.wlr_types.keyboard import KeyboardKeyEvent
 from xkbcommon import xkb
 
+from libnext.keybindings import Action
 from libnext.util import Listeners
 
 log = logging.getLogger("Next: Inputs")
 xkb_keysym = ffi.new("const xkb_keysym_t **")
 
+# Level 0 keysyms of a key and the keybinding action they trigger, if any.
+KeysymEntry = tuple[tuple[int, ...], Action | None]
+
 
 class NextKeyboard(Listeners):
     def __init__(self, core, device: InputDevice):
@@ -53,8 +56,17 @@ class NextKeyboard(Listeners):
         self.keymap = self.xkb_context.keymap_new_from_names()
         self.keyboard.set_keymap(self.keymap)
 
+        # Keysym translation cache:
+        # {group << 8 | modifiers: {xkb keycode: KeysymEntry}}
+        # self.keysyms points at the table of the current state, so a key
+        # press that was seen before costs one dict lookup and no allocations.
+        self.keysym_cache: dict[int, dict[int, KeysymEntry]] = {}
+        self.keysyms: dict[int, KeysymEntry] = {}
+        self.update_xkb_state()
+
         self.add_listener(self.keyboard.destroy_event, self._on_destroy)
         self.add_listener(self.keyboard.key_event, self._on_key)
+        self.add_listener(self.keyboard.keymap_event, self._on_keymap)
         self.add_listener(self.keyboard.modifiers_event, self._on_modifiers)
 
     def destroy(self) -> None:
@@ -63,69 +75,71 @@ class NextKeyboard(Listeners):
         if self.core.keyboards and self.core.seat.keyboard.destroyed:
             self.core.seat.set_keyboard(self.core.keyboards[-1].device)
 
+    def update_xkb_state(self) -> None:
+        """
+        Re-read the xkb pointers and modifier state from the wlr_keyboard.
+        """
+        self.xkb_state = self.keyboard._ptr.xkb_state
+        self.xkb_keymap = self.keyboard._ptr.keymap
+        self.modifiers: int = lib.wlr_keyboard_get_modifiers(self.keyboard._ptr)
+        group = self.keyboard._ptr.modifiers.group
+        self.keysyms = self.keysym_cache.setdefault(group << 8 | self.modifiers, {})
+
+    def invalidate_keysym_cache(self) -> None:
+        """
+        Drop cached translations, needed when the keymap or keybindings change.
+        """
+        self.keysym_cache.clear()
+        self.update_xkb_state()
+
+    def translate(self, keycode: int) -> KeysymEntry:
+        """
+        Resolve the keysyms and keybinding of a keycode in the current state
+        and cache the result.
+        """
+        layout_index = lib.xkb_state_key_get_layout(self.xkb_state, keycode)
+        nsyms = lib.xkb_keymap_key_get_syms_by_level(
+            self.xkb_keymap, keycode, layout_index, 0, xkb_keysym
+        )
+        keysyms = tuple(xkb_keysym[0][i] for i in range(nsyms))
+
+        # Keybinding lookup, see libnext.keybindings.binding_key().
+        action = None
+        modifiers = self.modifiers << 32
+        for keysym in keysyms:
+            action = self.core.keybindings.get(modifiers | keysym)
+            if action is not None:
+                break
+
+        entry = self.keysyms[keycode] = (keysyms, action)
+        return entry
+
     # Listeners
     def _on_destroy(self, _listener: Listener, _data: Any) -> None:
-        log.debug("Signal: wlr_keyboard_destroy_event")
         self.destroy()
 
     def _on_key(self, _listener: Listener, key_event: KeyboardKeyEvent) -> None:
-        log.debug("Signal: wlr_keyboard_key_event")
         # TODO: Add option to hide cursor when typing.
         # self.core.cursor.hide() -> From river.
 
         # Translate libinput keycode -> xkbcommon
         keycode = key_event.keycode + 8
+        entry = self.keysyms.get(keycode)
+        if entry is None:
+            entry = self.translate(keycode)
+
+        action = entry[1]
+        if action is not None and key_event.state == WlKeyboard.key_state.pressed:
+            action(self.core)
+            return
 
-        layout_index = lib.xkb_state_key_get_layout(
-            self.keyboard._ptr.xkb_state, keycode
-        )
-        nsyms = lib.xkb_keymap_key_get_syms_by_level(
-            self.keyboard._ptr.keymap, keycode, layout_index, 0, xkb_keysym
-        )
-        keysyms = [xkb_keysym[0][i] for i in range(nsyms)]
-        for keysym in keysyms:
-            # TODO: Support change_vt()
-            if (
-                self.keyboard.modifier == KeyboardModifier.ALT
-                and key_event.state == WlKeyboard.key_state.pressed  # noqa: W503
-            ):
-                if keysym == xkb.keysym_from_name("Escape"):
-                    # We don't care for sig_num anyways.
-                    self.core.signal_callback(0, self.core.display)
-                    return
-
-                if keysym == xkb.keysym_from_name("l"):
-                    subprocess.Popen(["alacritty"])
-                    return
-
-                if keysym == xkb.keysym_from_name("j"):
-                    if len(self.core.mapped_windows) >= 2:
-                        window = self.core.mapped_windows.pop()
-                        self.core.mapped_windows.insert(0, window)
-                        self.core.focus_window(self.core.mapped_windows[-1])
-                        return
-
-                if keysym == xkb.keysym_from_name("k"):
-                    if len(self.core.mapped_windows) >= 2:
-                        window = self.core.mapped_windows.pop(0)
-                        self.core.mapped_windows.append(window)
-                        self.core.focus_window(self.core.mapped_windows[-1])
-                        return
-
-                if keysym == xkb.keysym_from_name("q"):
-                    if self.core.mapped_windows:
-                        self.core.mapped_windows[-1].kill()
-                        return
-
-                if keysym == xkb.keysym_from_name("1"):
-                    self.core.backend.get_session().change_vt(1)
-                    return
-
-        log.debug("Key emitted to focused client")
         self.core.seat.set_keyboard(self.device)
         self.core.seat.keyboard_notify_key(key_event)
 
+    def _on_keymap(self, _listener: Listener, _data: Any) -> None:
+        self.invalidate_keysym_cache()
+
     def _on_modifiers(self, _listener: Listener, _data: Any):
-        log.debug("Signal: wlr_keyboard_modifiers_event")
+        self.update_xkb_state()
         self.core.seat.set_keyboard(self.device)
         self.core.seat.keyboard_notify_modifiers(self.keyboard.modifiers)
@@ -0,0 +1,177 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import logging
+import subprocess
+from typing import Any, Callable
+
+from wlroots.wlr_types.keyboard import KeyboardModifier
+from xkbcommon import xkb
+
+log = logging.getLogger("Next: Keybindings")
+
+# Actions are called with NextCore.
+Action = Callable[[Any], None]
+
+
+class Keybinding:
+    """
+    A (modifier mask, keysym name) -> action binding.
+    """
+
+    def __init__(self, modifiers: KeyboardModifier, key: str, action: Action):
+        self.modifiers = modifiers
+        self.key = key
+        self.action = action
+
+
+def binding_key(modifiers: int, keysym: int) -> int:
+    """
+    Packs a modifier mask and a keysym into the integer used to look up bindings.
+    """
+    return modifiers << 32 | keysym
+
+
+def compile_keybindings(keybindings: list[Keybinding]) -> dict[int, Action]:
+    """
+    Resolve keysym names once so key events only need a single dict lookup.
+    """
+    table: dict[int, Action] = {}
+    for keybinding in keybindings:
+        keysym = xkb.keysym_from_name(keybinding.key)
+        if keysym == 0:  # XKB_KEY_NoSymbol
+            log.error("Unknown keysym in keybinding: %s", keybinding.key)
+            continue
+
+        key = binding_key(int(keybinding.modifiers), keysym)
+        if key in table:
+            log.warning("Duplicate keybinding for %s, last one wins.", keybinding.key)
+        table[key] = keybinding.action
+    return table
+
+
+# Actions
+def spawn(command: list[str]) -> Action:
+    def _spawn(_core) -> None:
+        subprocess.Popen(command)
+
+    return _spawn
+
+
+def change_vt(vt: int) -> Action:
+    def _change_vt(core) -> None:
+        core.backend.get_session().change_vt(vt)
+
+    return _change_vt
+
+
+def terminate(core) -> None:
+    # We don't care for sig_num anyways.
+    core.signal_callback(0, core.display)
+
+
+def cycle_focus(core, steps: int) -> None:
+    """
+    Rotate focus through the mapped windows, windows on hidden tags are
+    skipped.
+    """
+    stack = core.mapped_windows
+    for _ in range(len(stack) - 1):
+        window = stack.rotate(steps)
+        if window is not None and window.enabled:
+            core.focus_window(window)
+            return
+    # Nothing else is visible, back to where we started.
+    stack.rotate(steps)
+
+
+def focus_next(core) -> None:
+    cycle_focus(core, 1)
+
+
+def focus_previous(core) -> None:
+    cycle_focus(core, -1)
+
+
+def focused_output(core):
+    focused = core.focus.focused
+    if focused is not None and focused.output is not None:
+        return focused.output
+    return core.output_at(core.cursor.x, core.cursor.y)
+
+
+def set_layout(namespace: str) -> Action:
+    def _set_layout(core) -> None:
+        output = focused_output(core)
+        if output is not None:
+            core.layout_manager.set_layout(output, namespace)
+
+    return _set_layout
+
+
+def view_tags(tags: int) -> Action:
+    def _view_tags(core) -> None:
+        output = focused_output(core)
+        if output is not None:
+            output.set_tags(tags)
+
+    return _view_tags
+
+
+def set_focused_tags(tags: int) -> Action:
+    def _set_focused_tags(core) -> None:
+        window = core.focus.focused
+        if window is not None and window.output is not None:
+            window.output.set_window_tags(window, tags)
+
+    return _set_focused_tags
+
+
+def cycle_layout(core) -> None:
+    output = focused_output(core)
+    if output is None:
+        return
+
+    namespaces = core.layout_manager.available_namespaces(output)
+    current = output.active_layout_namespace
+    index = namespaces.index(current) + 1 if current in namespaces else 0
+    core.layout_manager.set_layout(output, namespaces[index % len(namespaces)])
+
+
+def kill_focused(core) -> None:
+    # The top of the stack may be on hidden tags with nothing focused.
+    window = core.focus.focused
+    if window is not None:
+        window.kill()
+
+
+DEFAULT_KEYBINDINGS: list[Keybinding] = [
+    Keybinding(KeyboardModifier.ALT, "Escape", terminate),
+    Keybinding(KeyboardModifier.ALT, "l", spawn(["alacritty"])),
+    Keybinding(KeyboardModifier.ALT, "j", focus_next),
+    Keybinding(KeyboardModifier.ALT, "k", focus_previous),
+    Keybinding(KeyboardModifier.ALT, "q", kill_focused),
+    Keybinding(KeyboardModifier.ALT, "space", cycle_layout),
+    Keybinding(KeyboardModifier.ALT, "1", change_vt(1)),
+]
@@ -0,0 +1,266 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import logging
+from typing import Any
+
+from pywayland.server import Listener
+from wlroots.wlr_types import SceneNode
+from wlroots.wlr_types.layer_shell_v1 import (
+    LayerShellV1Layer,
+    LayerSurfaceV1,
+    LayerSurfaceV1Anchor,
+    LayerSurfaceV1KeyboardInteractivity,
+)
+
+from libnext._wlroots import lib as next_lib
+from libnext.util import Listeners
+
+log = logging.getLogger("Next: Layers")
+
+# Bottom to top.
+LAYERS = (
+    LayerShellV1Layer.BACKGROUND,
+    LayerShellV1Layer.BOTTOM,
+    LayerShellV1Layer.TOP,
+    LayerShellV1Layer.OVERLAY,
+)
+# Layers hidden while an output shows a fullscreen window.
+LAYERS_BELOW_FULLSCREEN = LAYERS[:3]
+
+Anchor = LayerSurfaceV1Anchor
+# Exclusive zones need the surface anchored to one edge, optionally
+# stretched along it.
+EXCLUSIVE_EDGES = (
+    (Anchor.TOP, (Anchor.TOP, Anchor.TOP | Anchor.HORIZONTAL)),
+    (Anchor.BOTTOM, (Anchor.BOTTOM, Anchor.BOTTOM | Anchor.HORIZONTAL)),
+    (Anchor.LEFT, (Anchor.LEFT, Anchor.LEFT | Anchor.VERTICAL)),
+    (Anchor.RIGHT, (Anchor.RIGHT, Anchor.RIGHT | Anchor.VERTICAL)),
+)
+
+
+def exclusive_edge(anchor: int) -> int | None:
+    for edge, anchors in EXCLUSIVE_EDGES:
+        if anchor in anchors:
+            return edge
+    return None
+
+
+class LayerSurface(Listeners):
+    """
+    A wlr-layer-shell surface: a panel, bar, wallpaper, lock screen and the
+    like, shown in one of the layer trees of its output.
+    """
+
+    def __init__(self, core, output, layer_surface: LayerSurfaceV1) -> None:
+        self.core = core
+        self.output = output
+        self.layer_surface = layer_surface
+        self.mapped: bool = False
+
+        self.layer = layer_surface.current.layer
+        self.scene_node = SceneNode(
+            next_lib.wlr_scene_subsurface_tree_create(
+                output.layer_trees[self.layer]._ptr, layer_surface.surface._ptr
+            )
+        )
+        # Layout box, last size sent and the state the box was computed from.
+        self.box: tuple[int, int, int, int] = (0, 0, 0, 0)
+        self.configured_size: tuple[int, int] | None = None
+        self.state = self.get_state()
+
+        output.layers[self.layer].append(self)
+
+        self.add_listener(layer_surface.map_event, self._on_map)
+        self.add_listener(layer_surface.unmap_event, self._on_unmap)
+        self.add_listener(layer_surface.destroy_event, self._on_destroy)
+        self.add_listener(layer_surface.surface.commit_event, self._on_commit)
+
+        self.output.arrange_layers()
+
+    def get_state(self) -> tuple:
+        """
+        Everything about the surface that affects where it goes.
+        """
+        current = self.layer_surface.current
+        margin = current.margin
+        return (
+            current.layer,
+            current.anchor,
+            current.exclusive_zone,
+            (margin.top, margin.right, margin.bottom, margin.left),
+            current.desired_width,
+            current.desired_height,
+            current.keyboard_interactive,
+        )
+
+    @property
+    def exclusive_zone(self) -> int:
+        return self.state[2]
+
+    @property
+    def wants_keyboard(self) -> bool:
+        if self.layer < LayerShellV1Layer.TOP:
+            return False
+        return self.state[6] != LayerSurfaceV1KeyboardInteractivity.NONE
+
+    @property
+    def exclusive_keyboard(self) -> bool:
+        """
+        Whether the surface keeps keyboard focus until it lets go, like a lock
+        screen. On demand surfaces lose it when a window gets focused.
+        """
+        if not self.wants_keyboard:
+            return False
+        return self.state[6] == LayerSurfaceV1KeyboardInteractivity.EXCLUSIVE
+
+    def arrange(self, full: tuple[int, int, int, int], usable: list[int]) -> None:
+        """
+        Place the surface within the output and take its exclusive zone out
+        of usable, an [x, y, width, height] list.
+        """
+        _, anchor, exclusive_zone, margin, width, height, _ = self.state
+        top, right, bottom, left = margin
+        bx, by, bw, bh = full if exclusive_zone == -1 else usable
+
+        if anchor & Anchor.HORIZONTAL == Anchor.HORIZONTAL and width == 0:
+            x = bx + left
+            width = bw - left - right
+        elif anchor & Anchor.LEFT:
+            x = bx + left
+        elif anchor & Anchor.RIGHT:
+            x = bx + bw - width - right
+        else:
+            x = bx + (bw - width) // 2
+
+        if anchor & Anchor.VERTICAL == Anchor.VERTICAL and height == 0:
+            y = by + top
+            height = bh - top - bottom
+        elif anchor & Anchor.TOP:
+            y = by + top
+        elif anchor & Anchor.BOTTOM:
+            y = by + bh - height - bottom
+        else:
+            y = by + (bh - height) // 2
+
+        width = max(width, 0)
+        height = max(height, 0)
+        if (x, y, width, height) != self.box:
+            self.box = (x, y, width, height)
+            self.scene_node.set_position(x, y)
+        if (width, height) != self.configured_size:
+            self.configured_size = (width, height)
+            self.layer_surface.configure(width, height)
+
+        if not self.mapped or exclusive_zone <= 0:
+            return
+        match exclusive_edge(anchor):
+            case Anchor.TOP:
+                usable[1] += exclusive_zone + top
+                usable[3] -= exclusive_zone + top
+            case Anchor.BOTTOM:
+                usable[3] -= exclusive_zone + bottom
+            case Anchor.LEFT:
+                usable[0] += exclusive_zone + left
+                usable[2] -= exclusive_zone + left
+            case Anchor.RIGHT:
+                usable[2] -= exclusive_zone + right
+
+    def surface_at(self, lx: float, ly: float) -> tuple[Any, float, float]:
+        x, y, _, _ = self.box
+        return self.layer_surface.surface_at(lx - x, ly - y)
+
+    def close(self) -> None:
+        self.layer_surface.destroy()
+
+    def _on_map(self, _listener: Listener, _data: Any) -> None:
+        self.mapped = True
+        self.output.arrange_layers()
+        if self.wants_keyboard:
+            self.core.focus.focus_layer(self)
+
+    def _on_unmap(self, _listener: Listener, _data: Any) -> None:
+        self.mapped = False
+        self.core.focus.unfocus_layer(self)
+        if self.output is not None:
+            self.output.arrange_layers()
+
+    def _on_destroy(self, _listener: Listener, _data: Any) -> None:
+        self.destroy_listeners()
+        self.core.focus.unfocus_layer(self)
+        if self.output is not None:
+            self.output.layers[self.layer].remove(self)
+            self.output.arrange_layers()
+            self.output = None
+
+    def _on_commit(self, _listener: Listener, _data: Any) -> None:
+        if self.output is None:
+            return
+        state = self.get_state()
+        # Most commits only carry new content, like a clock ticking on a bar,
+        # and don't need the output rearranged.
+        if state == self.state:
+            return
+        # Moving between layers can change wants_keyboard too.
+        keyboard_changed = state[6] != self.state[6] or state[0] != self.state[0]
+        self.state = state
+
+        layer = state[0]
+        if layer != self.layer:
+            self.output.layers[self.layer].remove(self)
+            self.layer = layer
+            self.output.layers[layer].append(self)
+            next_lib.wlr_scene_node_reparent(
+                self.scene_node._ptr, self.output.layer_trees[layer]._ptr
+            )
+        if keyboard_changed and self.mapped:
+            if self.wants_keyboard:
+                self.core.focus.focus_layer(self)
+            else:
+                self.core.focus.unfocus_layer(self)
+        self.output.arrange_layers()
+
+
+def arrange_layers(output) -> bool:
+    """
+    Place the layer surfaces of one output, top layer first and surfaces
+    with an exclusive zone before the others in each layer.
+    Returns whether the usable area of the output changed.
+    """
+    full = output.geometry
+    usable = list(full)
+    for layer in reversed(LAYERS):
+        surfaces = output.layers[layer]
+        for surface in surfaces:
+            if surface.exclusive_zone > 0:
+                surface.arrange(full, usable)
+        for surface in surfaces:
+            if surface.exclusive_zone <= 0:
+                surface.arrange(full, usable)
+
+    x, y, width, height = full
+    ux, uy, uwidth, uheight = usable
+    zones = (uy - y, x + width - ux - uwidth, y + height - uy - uheight, ux - x)
+    return output.set_exclusive_zones(zones)
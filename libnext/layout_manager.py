@@ -23,20 +23,295 @@
 # EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import logging
+from typing import Any
 
-# TODO: Figure out why this breaks mypy.
-from pywayland.protocol.river_layout_v3 import RiverLayoutManagerV3  # ignore: type
 from pywayland.protocol_core.globals import Global
-from pywayland.server import Display
+from pywayland.protocol_core.resource import Resource
+
+from libnext._protocols.river_layout_v3 import RiverLayoutManagerV3, RiverLayoutV3
+from libnext._wlroots import lib as next_lib
+from libnext.layouts import BuiltinLayout, default_layouts
+from libnext.metrics import Metric
+from libnext.resources import resource_client, setup_resource
 
 log = logging.getLogger("Next: LayoutManager")
 
+# How long a layout generator gets to answer a demand.
+LAYOUT_TIMEOUT_MS = 100
+# Cached layouts per layout object.
+LAYOUT_CACHE_SIZE = 32
+
+# (x, y, width, height)
+Box = tuple[int, int, int, int]
+# (view count, usable width, usable height, tags)
+DemandKey = tuple[int, int, int, int]
+
+
+class LayoutDemand:
+    """
+    A layout_demand that was sent and not committed yet.
+    """
+
+    def __init__(self, serial: int, key: DemandKey, views: list, area: Box) -> None:
+        self.serial = serial
+        self.key = key
+        self.views = views
+        self.area = area
+        self.boxes: list[Box] = []
+
+
+class Layout:
+    """
+    A river_layout_v3 object: a layout generator client serving one output.
+
+    Layouts are treated as a function of the demand, so committed results are
+    cached by (view count, usable area, tags) and identical demands are
+    answered from the cache without a round trip.
+    """
+
+    def __init__(self, manager, resource: Resource, output, namespace: str) -> None:
+        self.manager = manager
+        self.resource = resource
+        self.output = output
+        self.namespace = namespace
+        self.client = resource_client(resource)
+        self.layout_name: str = namespace
+
+        self.demand: LayoutDemand | None = None
+        self.committed_serial: int | None = None
+        self.last_good: list[Box] | None = None
+        self.cache: dict[DemandKey, list[Box]] = {}
+        self.timer = manager.core.event_loop.add_timer(self._on_timeout)
+
+        resource.dispatcher["push_view_dimensions"] = self._on_push_view_dimensions
+        resource.dispatcher["commit"] = self._on_commit
+
+    def destroy(self) -> None:
+        self.demand = None
+        self.timer.remove()
+
+    def demand_layout(self, views: list, area: Box, tags: int) -> None:
+        """
+        Ask the client for a layout, superseding any pending demand.
+        """
+        metrics = self.manager.core.metrics
+        key = (len(views), area[2], area[3], tags)
+        boxes = self.cache.get(key)
+        if boxes is not None:
+            metrics.incr(Metric.LAYOUT_CACHE_HITS)
+            self.demand = None
+            self.timer.timer_update(0)
+            self.manager.apply(self.output, views, area, boxes)
+            return
+
+        metrics.incr(Metric.LAYOUT_DEMANDS)
+        serial = self.manager.core.display.next_serial()
+        self.demand = LayoutDemand(serial, key, views, area)
+        self.resource.layout_demand(len(views), area[2], area[3], tags, serial)
+        self.timer.timer_update(LAYOUT_TIMEOUT_MS)
+
+    def send_user_command(self, command: str) -> None:
+        # The command may change the layout, so cached results are stale.
+        self.cache.clear()
+        self.resource.user_command(command)
+
+    def _on_push_view_dimensions(
+        self, _resource: Resource, x: int, y: int, width: int, height: int, serial: int
+    ) -> None:
+        demand = self.demand
+        if demand is None or serial != demand.serial:
+            return
+        demand.boxes.append((x, y, width, height))
+
+    def _on_commit(self, resource: Resource, layout_name: str, serial: int) -> None:
+        demand = self.demand
+        if demand is None or serial != demand.serial:
+            if serial == self.committed_serial:
+                resource._post_error(
+                    RiverLayoutV3.error.already_committed,
+                    f"layout demand {serial} was already committed",
+                )
+            else:
+                # Answer to a demand that was superseded or timed out.
+                self.manager.core.metrics.incr(Metric.LAYOUT_STALE_COMMITS)
+            return
+
+        self.demand = None
+        self.timer.timer_update(0)
+        if len(demand.boxes) != demand.key[0]:
+            resource._post_error(
+                RiverLayoutV3.error.count_mismatch,
+                f"expected {demand.key[0]} views, got {len(demand.boxes)}",
+            )
+            return
+
+        self.committed_serial = serial
+        self.layout_name = layout_name
+        self.last_good = demand.boxes
+        if len(self.cache) >= LAYOUT_CACHE_SIZE:
+            del self.cache[next(iter(self.cache))]
+        self.cache[demand.key] = demand.boxes
+        self.manager.apply(self.output, demand.views, demand.area, demand.boxes)
+
+    def _on_timeout(self, _data: Any) -> int:
+        demand = self.demand
+        if demand is None:
+            return 0
+
+        self.demand = None
+        self.manager.core.metrics.incr(Metric.LAYOUT_TIMEOUTS)
+        log.warning("Layout %s timed out, using the last good layout", self.namespace)
+        if self.last_good is not None and len(self.last_good) == len(demand.views):
+            self.manager.apply(self.output, demand.views, demand.area, self.last_good)
+        else:
+            self.manager.apply_fallback(self.output, demand.views, demand.area)
+        return 0
+
 
 class LayoutManager(Global):
-    def __init__(self, display: Display) -> None:
+    """
+    Server side of river_layout_manager_v3.
+
+    Layout generators are external clients that create one river_layout_v3
+    object per output and namespace. Built-in layouts (see libnext.layouts)
+    occupy namespaces of their own and are computed in-process without a
+    round trip. The output uses the layout whose namespace it is set to,
+    windows are stacked on top of each other over the usable area while an
+    external layout isn't connected.
+    """
+
+    def __init__(self, core) -> None:
+        self.core = core
         self.interface = RiverLayoutManagerV3
-        super().__init__(display, 1)
+        super().__init__(core.display, 1)
+        self.bind_func = self._on_bind
+        self.layouts: dict[Resource, Layout] = {}
+        self.builtin_layouts: dict[str, BuiltinLayout] = default_layouts()
+        # pywayland doesn't keep resources alive, we hold them until destroyed.
+        self.resources: set[Resource] = set()
         log.debug("Created RiverLayoutManagerV3 global")
 
     def destroy(self) -> None:
+        for layout in self.layouts.values():
+            layout.destroy()
+        self.layouts.clear()
+        self.resources.clear()
         super().destroy()
+
+    def arrange(self, output) -> None:
+        """
+        Lay out the tiled windows of an output.
+        """
+        views = output.layout_windows()
+        if not views:
+            return
+
+        area = output.usable_area
+        namespace = output.active_layout_namespace
+        builtin = self.builtin_layouts.get(namespace)
+        if builtin is not None:
+            boxes = builtin.arrange(len(views), area[2], area[3])
+            self.apply(output, views, area, boxes)
+            return
+
+        layout = output.layouts.get(namespace)
+        if layout is None:
+            self.apply_fallback(output, views, area)
+        else:
+            layout.demand_layout(views, area, output.tags)
+
+    def set_layout(self, output, namespace: str | None) -> None:
+        """
+        Switch an output to a built-in or external layout namespace.
+        None goes back to the default namespace.
+        """
+        output.layout_namespace = namespace
+        output.arrange()
+
+    def available_namespaces(self, output) -> list[str]:
+        return list(self.builtin_layouts) + list(output.layouts)
+
+    def apply(self, output, views: list, area: Box, boxes: list[Box]) -> None:
+        area_x, area_y, _, _ = area
+        for window, (x, y, width, height) in zip(views, boxes):
+            # Windows may have gone away while the layout was being generated.
+            if window.mapped and window.output is output:
+                window.place(
+                    area_x + x, area_y + y, width, height, self.core.border_width, None
+                )
+        self.core.transactions.commit()
+
+    def apply_fallback(self, output, views: list, area: Box) -> None:
+        self.apply(output, views, area, [(0, 0, area[2], area[3])] * len(views))
+
+    def output_destroyed(self, output) -> None:
+        for layout in output.layouts.values():
+            layout.destroy()
+        output.layouts.clear()
+
+    def output_from_resource(self, output_resource: Any) -> Any:
+        wlr_output = next_lib.wlr_output_from_resource(output_resource)
+        for output in self.core.outputs:
+            if output.wlr_output._ptr == wlr_output:
+                return output
+        return None
+
+    def namespace_in_use(self, output, client: Any, namespace: str) -> bool:
+        """
+        Namespaces are unique per output and can't be shared between clients.
+        Built-in layout names are always taken.
+        """
+        if namespace in self.builtin_layouts:
+            return True
+        for layout in self.layouts.values():
+            if layout.namespace == namespace and (
+                layout.output is output or layout.client != client
+            ):
+                return True
+        return False
+
+    def _on_bind(self, resource: Resource) -> None:
+        setup_resource(resource, self.resources.discard)
+        self.resources.add(resource)
+        resource.dispatcher["get_layout"] = self._on_get_layout
+
+    def _on_get_layout(
+        self,
+        _resource: Resource,
+        layout_resource: Resource,
+        output_resource: Any,
+        namespace: str,
+    ) -> None:
+        setup_resource(layout_resource, self._on_layout_destroy)
+        self.resources.add(layout_resource)
+
+        output = self.output_from_resource(output_resource)
+        if output is None:
+            # The output is gone, leave the layout object inert.
+            return
+
+        client = resource_client(layout_resource)
+        if self.namespace_in_use(output, client, namespace):
+            layout_resource.namespace_in_use()
+            return
+
+        layout = Layout(self, layout_resource, output, namespace)
+        self.layouts[layout_resource] = layout
+        output.layouts[namespace] = layout
+        log.debug("New layout %s", namespace)
+
+        if output.active_layout_namespace == namespace:
+            self.arrange(output)
+
+    def _on_layout_destroy(self, resource: Resource) -> None:
+        self.resources.discard(resource)
+        layout = self.layouts.pop(resource, None)
+        if layout is None:
+            return
+
+        layout.destroy()
+        output = layout.output
+        if output.layouts.get(layout.namespace) is layout:
+            del output.layouts[layout.namespace]
+            if output.active_layout_namespace == layout.namespace:
+                self.arrange(output)
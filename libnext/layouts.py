@@ -0,0 +1,146 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import math
+from abc import ABC, abstractmethod
+
+# (x, y, width, height) relative to the usable area.
+Box = tuple[int, int, int, int]
+
+
+class BuiltinLayout(ABC):
+    """
+    In-process layout generator.
+
+    arrange() computes the boxes of all windows of an output in one pass,
+    in layout order, the same answer a river_layout_v3 client would commit.
+    """
+
+    name: str
+
+    @abstractmethod
+    def arrange(self, count: int, width: int, height: int) -> list[Box]:
+        pass
+
+
+class MasterStack(BuiltinLayout):
+    """
+    Main windows on the left, the rest stacked on the right.
+    """
+
+    name = "master-stack"
+
+    def __init__(self, main_ratio: float = 0.55, main_count: int = 1) -> None:
+        self.main_ratio = main_ratio
+        self.main_count = main_count
+
+    def arrange(self, count: int, width: int, height: int) -> list[Box]:
+        main_count = min(self.main_count, count)
+        stack_count = count - main_count
+        if main_count == 0 or stack_count == 0:
+            main_width = width
+        else:
+            main_width = int(width * self.main_ratio)
+
+        boxes = [(0, y, main_width, h) for y, h in split(height, main_count)]
+        boxes += [
+            (main_width, y, width - main_width, h)
+            for y, h in split(height, stack_count)
+        ]
+        return boxes
+
+
+class Monocle(BuiltinLayout):
+    """
+    Every window takes the whole usable area.
+    """
+
+    name = "monocle"
+
+    def arrange(self, count: int, width: int, height: int) -> list[Box]:
+        return [(0, 0, width, height)] * count
+
+
+class Grid(BuiltinLayout):
+    """
+    Rows of equally sized windows, the last row stretches to fill.
+    """
+
+    name = "grid"
+
+    def arrange(self, count: int, width: int, height: int) -> list[Box]:
+        if count == 0:
+            return []
+        columns = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / columns)
+
+        boxes: list[Box] = []
+        for row, (y, row_height) in enumerate(split(height, rows)):
+            row_count = min(columns, count - row * columns)
+            boxes += [(x, y, w, row_height) for x, w in split(width, row_count)]
+        return boxes
+
+
+class Spiral(BuiltinLayout):
+    """
+    Each window takes half of the remaining space, alternating between
+    vertical and horizontal splits.
+    """
+
+    name = "spiral"
+
+    def arrange(self, count: int, width: int, height: int) -> list[Box]:
+        boxes: list[Box] = []
+        x, y = 0, 0
+        for index in range(count):
+            if index == count - 1:
+                boxes.append((x, y, width, height))
+            elif index % 2 == 0:
+                half = width // 2
+                boxes.append((x, y, half, height))
+                x += half
+                width -= half
+            else:
+                half = height // 2
+                boxes.append((x, y, width, half))
+                y += half
+                height -= half
+        return boxes
+
+
+def split(length: int, count: int) -> list[tuple[int, int]]:
+    """
+    Split a length into count (offset, size) pairs of nearly equal size
+    that add up to exactly the length.
+    """
+    if count <= 0:
+        return []
+    offsets = [length * i // count for i in range(count + 1)]
+    return [(offsets[i], offsets[i + 1] - offsets[i]) for i in range(count)]
+
+
+def default_layouts() -> dict[str, BuiltinLayout]:
+    layouts: list[BuiltinLayout] = [MasterStack(), Monocle(), Grid(), Spiral()]
+    return {layout.name: layout for layout in layouts}
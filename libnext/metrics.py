@@ -0,0 +1,176 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import functools
+import time
+from array import array
+from bisect import bisect_left
+from enum import IntEnum
+from typing import Any, Callable
+
+# Upper bounds of the listener duration histogram buckets, the last bucket
+# takes everything slower.
+LISTENER_BUCKETS_US = (10, 50, 100, 500, 1000, 5000, 16000)
+# Listener callbacks with their own counters, the rest share the last slot.
+LISTENER_SLOTS = 256
+
+
+class Metric(IntEnum):
+    """
+    Counters kept by the compositor, see Metrics.
+    """
+
+    FOCUS_CHANGES = 0
+    FOCUS_SKIPPED = 1
+    LAYOUT_DEMANDS = 2
+    LAYOUT_CACHE_HITS = 3
+    LAYOUT_STALE_COMMITS = 4
+    LAYOUT_TIMEOUTS = 5
+    TRANSACTIONS = 6
+    TRANSACTION_TIMEOUTS = 7
+    TRANSACTION_FRAMES_HELD = 8
+    CONFIGURES_SENT = 9
+    CONFIGURES_SUPPRESSED = 10
+    FRAMES_RENDERED = 11
+    FRAMES_SKIPPED = 12
+    FRAMES_SCANNED_OUT = 13
+    CONTROL_COMMANDS = 14
+    CONTROL_BATCHES = 15
+
+
+class Metrics:
+    """
+    Preallocated counters indexed by Metric.
+    Incrementing one is a single array store, so it's fine on hot paths.
+    """
+
+    def __init__(self) -> None:
+        self.counters = array("Q", bytes(8 * len(Metric)))
+
+    def incr(self, metric: Metric, amount: int = 1) -> None:
+        self.counters[metric] += amount
+
+    def get(self, metric: Metric) -> int:
+        return self.counters[metric]
+
+    def reset(self) -> None:
+        for index in range(len(self.counters)):
+            self.counters[index] = 0
+
+    def snapshot(self) -> dict[str, int]:
+        return {metric.name.lower(): self.counters[metric] for metric in Metric}
+
+
+class ListenerMetrics:
+    """
+    Calls, wall time and a duration histogram per listener callback, keyed
+    by its qualified name so every object's listener for the same signal
+    adds up in one slot. Counters are preallocated, recording a call is a
+    few array stores.
+    """
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.slots: dict[str, int] = {}
+        self.calls = array("Q", bytes(8 * LISTENER_SLOTS))
+        self.total_ns = array("Q", bytes(8 * LISTENER_SLOTS))
+        self.max_ns = array("Q", bytes(8 * LISTENER_SLOTS))
+        self.histogram = array(
+            "Q", bytes(8 * LISTENER_SLOTS * (len(LISTENER_BUCKETS_US) + 1))
+        )
+
+    def slot(self, name: str) -> int:
+        slot = self.slots.get(name)
+        if slot is None:
+            if len(self.names) < LISTENER_SLOTS - 1:
+                slot = len(self.names)
+                self.names.append(name)
+            else:
+                slot = LISTENER_SLOTS - 1
+            self.slots[name] = slot
+        return slot
+
+    def measured(self, callback: Callable) -> Callable:
+        """
+        Wrap a listener callback so its calls are recorded.
+        """
+        slot = self.slot(callback.__qualname__)
+        calls, total_ns, max_ns, histogram = (
+            self.calls,
+            self.total_ns,
+            self.max_ns,
+            self.histogram,
+        )
+        bounds = tuple(bound * 1000 for bound in LISTENER_BUCKETS_US)
+        base = slot * (len(bounds) + 1)
+        clock = time.monotonic_ns
+
+        @functools.wraps(callback)
+        def _measured(listener: Any, data: Any) -> None:
+            start = clock()
+            try:
+                callback(listener, data)
+            finally:
+                elapsed = clock() - start
+                calls[slot] += 1
+                total_ns[slot] += elapsed
+                if elapsed > max_ns[slot]:
+                    max_ns[slot] = elapsed
+                histogram[base + bisect_left(bounds, elapsed)] += 1
+
+        return _measured
+
+    def reset(self) -> None:
+        for counters in (self.calls, self.total_ns, self.max_ns, self.histogram):
+            for index in range(len(counters)):
+                counters[index] = 0
+
+    def snapshot(self) -> dict[str, dict]:
+        buckets = len(LISTENER_BUCKETS_US) + 1
+        report = {}
+        for slot in range(LISTENER_SLOTS):
+            calls = self.calls[slot]
+            if not calls:
+                continue
+            name = self.names[slot] if slot < len(self.names) else "<other>"
+            start = slot * buckets
+            counts = [self.histogram[start + bucket] for bucket in range(buckets)]
+            histogram = {
+                "le_%d_us" % bound: count
+                for bound, count in zip(LISTENER_BUCKETS_US, counts)
+            }
+            histogram["inf"] = counts[-1]
+            report[name] = {
+                "calls": calls,
+                "total_us": self.total_ns[slot] // 1000,
+                "max_us": self.max_ns[slot] // 1000,
+                "mean_us": self.total_ns[slot] // calls // 1000,
+                "histogram": histogram,
+            }
+        return report
+
+
+# Shared by every Listeners object, see Listeners.add_listener().
+listener_metrics = ListenerMetrics()
@@ -0,0 +1,263 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import logging
+from typing import Any
+
+from pywayland.protocol.wayland import WlOutput
+from pywayland.server import Listener
+from wlroots.wlr_types import Output
+from wlroots.wlr_types.output import OutputMode
+from wlroots.wlr_types.output_management_v1 import (
+    OutputConfigurationHeadV1,
+    OutputConfigurationV1,
+    OutputHeadV1State,
+    OutputManagerV1,
+)
+
+from libnext.util import Listeners
+
+log = logging.getLogger("Next: OutputConfig")
+
+# Width, height and refresh rate in mHz.
+Mode = tuple[int, int, int]
+
+
+def output_identity(wlr_output: Output) -> str:
+    """
+    Identify a monitor by its EDID make, model and serial, falling back to the
+    connector name for outputs without an EDID.
+    """
+    parts = (wlr_output.make, wlr_output.model, wlr_output.serial)
+    identity = " ".join(part for part in parts if part)
+    return identity or wlr_output.name or ""
+
+
+def find_mode(wlr_output: Output, mode: Mode) -> OutputMode | None:
+    for output_mode in wlr_output.modes:
+        if (
+            output_mode.width,
+            output_mode.height,
+            output_mode.refresh_mhz,
+        ) == mode:
+            return output_mode
+    return None
+
+
+class OutputSettings:
+    """
+    The state of an output worth restoring when the monitor comes back.
+    Position is only kept when a client picked it.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        mode: Mode | None,
+        scale: float,
+        transform: WlOutput.transform,
+        position: tuple[int, int] | None = None,
+    ) -> None:
+        self.enabled = enabled
+        self.mode = mode
+        self.scale = scale
+        self.transform = transform
+        self.position = position
+
+    @classmethod
+    def from_output(cls, wlr_output: Output) -> "OutputSettings":
+        current = wlr_output.current_mode
+        mode = None
+        if current is not None:
+            mode = (current.width, current.height, current.refresh_mhz)
+        return cls(wlr_output.enabled, mode, wlr_output.scale, wlr_output.transform)
+
+    @classmethod
+    def from_head(cls, state: OutputHeadV1State) -> "OutputSettings":
+        if state.mode is not None:
+            mode = (state.mode.width, state.mode.height, state.mode.refresh_mhz)
+        else:
+            custom = state.custom_mode
+            mode = (custom.width, custom.height, custom.refresh)
+        return cls(
+            state.enabled, mode, state.scale, state.transform, (state.x, state.y)
+        )
+
+    def stage(self, wlr_output: Output) -> None:
+        """
+        Set these settings as the pending state of the output.
+        """
+        wlr_output.enable(enable=self.enabled)
+        if not self.enabled:
+            return
+        if self.mode is not None:
+            mode = find_mode(wlr_output, self.mode)
+            if mode is not None:
+                wlr_output.set_mode(mode)
+            else:
+                wlr_output.set_custom_mode(*self.mode)
+        wlr_output.set_scale(self.scale)
+        wlr_output.set_transform(self.transform)
+
+
+class OutputConfigurator(Listeners):
+    """
+    Picks the state of new outputs and handles wlr-output-management requests.
+
+    Settings are remembered per monitor, a monitor that's plugged in again
+    gets its last state back with a single test and commit. Layout and the
+    configuration sent to clients are updated from one idle callback, so a
+    burst of outputs appearing at once costs one relayout.
+    """
+
+    def __init__(self, core) -> None:
+        self.core = core
+        self.manager = OutputManagerV1(core.display)
+        self.cache: dict[str, OutputSettings] = {}
+        self.update_pending: bool = False
+
+        self.add_listener(self.manager.apply_event, self._on_apply)
+        self.add_listener(self.manager.test_event, self._on_test)
+        self.add_listener(core.output_layout.change_event, self._on_layout_change)
+
+    def configure_new_output(self, wlr_output: Output) -> OutputSettings | None:
+        """
+        Enable a new output, returns the cached settings used if any.
+        """
+        identity = output_identity(wlr_output)
+        settings = self.cache.get(identity)
+        if settings is not None:
+            settings.stage(wlr_output)
+            if wlr_output.test():
+                wlr_output.commit()
+                log.debug("Restored cached settings of %s", identity)
+                return settings
+            wlr_output.rollback()
+            log.info("Cached settings of %s were rejected", identity)
+
+        # Outputs without modes, like nested ones, come up enabled.
+        mode = wlr_output.preferred_mode()
+        if mode is not None:
+            wlr_output.set_mode(mode)
+            wlr_output.enable()
+            wlr_output.commit()
+        self.cache[identity] = OutputSettings.from_output(wlr_output)
+        return None
+
+    def schedule_update(self) -> None:
+        if not self.update_pending:
+            self.update_pending = True
+            self.core.event_loop.add_idle(self._on_update)
+
+    def publish(self) -> None:
+        """
+        Send the current output state to output management clients.
+        """
+        config = OutputConfigurationV1()
+        for output in [*self.core.outputs, *self.core.disabled_outputs]:
+            head = OutputConfigurationHeadV1.create(config, output.wlr_output)
+            if output.wlr_output.enabled:
+                head.state.x = output.x
+                head.state.y = output.y
+        self.manager.set_configuration(config)
+
+    def handle_configuration(self, config: OutputConfigurationV1, apply: bool) -> None:
+        changes = [
+            (head.state.output, OutputSettings.from_head(head.state))
+            for head in config.heads
+        ]
+        accepted = True
+        for wlr_output, settings in changes:
+            settings.stage(wlr_output)
+            if not wlr_output.test():
+                log.info("Output configuration rejected by %s", wlr_output.name)
+                accepted = False
+                break
+
+        if accepted and apply:
+            accepted = self.commit(changes)
+        else:
+            for wlr_output, _ in changes:
+                wlr_output.rollback()
+
+        if accepted:
+            config.send_succeeded()
+        else:
+            config.send_failed()
+        config.destroy()
+
+    def commit(self, changes: list[tuple[Output, OutputSettings]]) -> bool:
+        """
+        Commit tested changes to every output, and put back the outputs that
+        were already committed if one of them fails.
+        """
+        previous = [OutputSettings.from_output(wlr_output) for wlr_output, _ in changes]
+        for index, (wlr_output, _) in enumerate(changes):
+            try:
+                wlr_output.commit()
+            except RuntimeError as e:
+                log.error("Failed to commit output %s: %s", wlr_output.name, e)
+                for pending, _ in changes[index:]:
+                    pending.rollback()
+                self.revert(changes[:index], previous)
+                return False
+
+        for wlr_output, settings in changes:
+            self.cache[output_identity(wlr_output)] = settings
+            output = wlr_output.data
+            if settings.enabled:
+                output.enable(*settings.position)
+            else:
+                output.disable()
+        self.schedule_update()
+        return True
+
+    def revert(
+        self,
+        changes: list[tuple[Output, OutputSettings]],
+        previous: list[OutputSettings],
+    ) -> None:
+        for (wlr_output, _), settings in zip(changes, previous):
+            settings.stage(wlr_output)
+            try:
+                wlr_output.commit()
+            except RuntimeError as e:
+                log.error("Failed to restore output %s: %s", wlr_output.name, e)
+
+    def _on_update(self, _data: Any) -> None:
+        self.update_pending = False
+        for output in self.core.outputs:
+            if output.update_geometry():
+                output.arrange_layers()
+        self.publish()
+
+    def _on_layout_change(self, _listener: Listener, _data: Any) -> None:
+        self.schedule_update()
+
+    def _on_apply(self, _listener: Listener, config: OutputConfigurationV1) -> None:
+        self.handle_configuration(config, True)
+
+    def _on_test(self, _listener: Listener, config: OutputConfigurationV1) -> None:
+        self.handle_configuration(config, False)
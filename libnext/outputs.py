@@ -27,9 +27,17 @@ from typing import Any
 
 from pywayland.server import Listener
 from wlroots.util.clock import Timespec
-from wlroots.wlr_types import OutputDamage
+from wlroots.wlr_types import OutputDamage, SceneNode
+from wlroots.wlr_types.scene import SceneOutput
 
+from libnext import layers
+from libnext._wlroots import ffi as next_ffi
+from libnext._wlroots import lib as next_lib
+from libnext.frame_timing import FrameTimings
+from libnext.metrics import Metric
+from libnext.render_scheduler import RenderScheduler
 from libnext.util import Listeners
+from libnext.window_stack import WindowStack, tag_bits
 
 log = logging.getLogger("Next: Outputs")
 
@@ -38,39 +46,451 @@ class NextOutput(Listeners):
     def __init__(self, core, wlr_output):
         self.core = core
         self.wlr_output = wlr_output
+        wlr_output.data = self
         self.damage: OutputDamage = OutputDamage(wlr_output)
+        self.scene_output: SceneOutput | None = None
+        self.frames_rendered: int = 0
+        self.frames_skipped: int = 0
+        self.frames_scanned_out: int = 0
+        # Whether the last frame was a direct scan-out of a client buffer.
+        self.scanout: bool = False
+        self.frame_timings = FrameTimings()
+        self.render_scheduler = RenderScheduler(core.max_render_time, core.clock)
+        self.render_timer = core.event_loop.add_timer(self._on_render_timer)
         self.core.output_layout.add_auto(self.wlr_output)
-        self.x, self.y = self.core.output_layout.output_coords(wlr_output)
-        self.width: int
-        self.height: int
+
+        # Layout box and scale, only refreshed by update_geometry() so layout
+        # code never has to call into wlroots.
+        self.x: int = 0
+        self.y: int = 0
+        self.width: int = 0
+        self.height: int = 0
+        self.scale: float = 1.0
+        self.geometry: tuple[int, int, int, int] = (0, 0, 0, 0)
+        # Space taken by layer surfaces on each edge: top, right, bottom, left.
+        self.exclusive_zones: tuple[int, int, int, int] = (0, 0, 0, 0)
+        # Geometry minus exclusive zones, where windows get tiled.
+        self.usable_area: tuple[int, int, int, int] = (0, 0, 0, 0)
+        self.update_geometry()
+        self.update_usable_area()
+
+        # Windows on this output, overall and per tag index.
+        self.windows: WindowStack = WindowStack()
+        self.tag_stacks: dict[int, WindowStack] = {}
+        # Layout order, newest window first. Unlike the stacks above this
+        # isn't touched by focus changes.
+        self.layout_views: WindowStack = WindowStack()
+        # Focused tags, a bit mask like Window.tags.
+        self.tags: int = 1
+        # The only window shown while set, see set_fullscreen_window().
+        self.fullscreen_window = None
+
+        # Layer surfaces by layer, each layer has a scene tree per output
+        # under the global one for that layer.
+        self.layers: dict[int, list[layers.LayerSurface]] = {
+            layer: [] for layer in layers.LAYERS
+        }
+        self.layer_trees: dict[int, SceneNode] = {
+            layer: SceneNode(
+                next_lib.next_scene_tree_create(core.layer_trees[layer]._ptr)
+            )
+            for layer in layers.LAYERS
+        }
+
+        # river_layout_v3 objects by namespace, see LayoutManager.
+        self.layouts: dict = {}
+        self.layout_namespace: str | None = None
 
         self.core.outputs.append(self)
 
         self.add_listener(self.wlr_output.destroy_event, self._on_destroy)
         self.add_listener(self.damage.frame_event, self._on_frame)
+        self.add_listener(self.wlr_output.present_event, self._on_present)
 
-    def get_geometry(self) -> tuple[int, int, int, int]:
-        width, height = self.wlr_output.effective_resolution()
-        return int(self.x), int(self.y), width, height
+        if core.wants_adaptive_sync(wlr_output.name):
+            self.set_adaptive_sync(True)
 
-    def destroy(self) -> None:
+    def update_geometry(self) -> bool:
+        """
+        Refresh the cached geometry and scale, returns whether they changed.
+        The output layout emits a change for mode, scale and transform
+        changes too, so that's the only event this needs to follow. The usable
+        area is left to arrange_layers(), which lays windows out again when
+        it moved.
+        """
+        box = self.core.output_layout.get_box(self.wlr_output)
+        if box is None:
+            return False
+        geometry = (box.x, box.y, box.width, box.height)
+        scale = self.wlr_output.scale
+        if geometry == self.geometry and scale == self.scale:
+            return False
+
+        self.x, self.y, self.width, self.height = self.geometry = geometry
+        self.scale = scale
+        return True
+
+    def set_exclusive_zones(self, zones: tuple[int, int, int, int]) -> bool:
+        """
+        Returns whether the usable area changed.
+        """
+        self.exclusive_zones = zones
+        return self.update_usable_area()
+
+    def update_usable_area(self) -> bool:
+        x, y, width, height = self.geometry
+        top, right, bottom, left = self.exclusive_zones
+        area = (
+            x + left,
+            y + top,
+            max(width - left - right, 0),
+            max(height - top - bottom, 0),
+        )
+        if area == self.usable_area:
+            return False
+        self.usable_area = area
+        return True
+
+    def arrange_layers(self) -> None:
+        """
+        Place our layer surfaces, windows are only laid out again when that
+        changed the usable area.
+        """
+        if layers.arrange_layers(self):
+            self.arrange()
+
+    def arrange(self) -> None:
+        """
+        Place the fullscreen window, if any, and lay out the tiled windows.
+        While control commands are being run it's done once they're all in.
+        """
+        batch = self.core.control.arrange_batch
+        if batch is not None:
+            batch.add(self)
+            return
+        if self.fullscreen_window is not None:
+            self.fullscreen_window.place(*self.geometry, 0, None)
+        self.core.layout_manager.arrange(self)
+        self.core.transactions.commit()
+
+    def enable(self, x: int, y: int) -> None:
+        """
+        Put an output that was enabled through output management at the given
+        layout position.
+        """
+        self.core.output_layout.add(self.wlr_output, x, y)
+        if self in self.core.disabled_outputs:
+            self.core.disabled_outputs.remove(self)
+            self.core.outputs.append(self)
+
+    def disable(self) -> None:
+        """
+        Take a disabled output out of the layout, its windows move elsewhere.
+        """
+        if self not in self.core.outputs:
+            return
         self.core.outputs.remove(self)
+        self.core.disabled_outputs.append(self)
+        self.core.output_layout.remove(self.wlr_output)
+        # The scene output goes away with the layout output, a pending
+        # delayed render must not look for it.
+        self.scene_output = None
+        self.render_timer.timer_update(0)
+        self.hand_over_windows()
+        self.close_layer_surfaces()
+
+    def close_layer_surfaces(self) -> None:
+        for surfaces in self.layers.values():
+            for surface in list(surfaces):
+                surface.output = None
+                surface.close()
+            surfaces.clear()
+
+    def layer_surface_at(
+        self, lx: float, ly: float, search: tuple[int, ...]
+    ) -> tuple[Any, float, float] | None:
+        """
+        Find the surface of a mapped layer surface at the given layout
+        coordinates, looking through the given layers top to bottom. Layers
+        hidden by a fullscreen window are skipped.
+        """
+        hidden: tuple[int, ...] = ()
+        if self.fullscreen_window is not None:
+            hidden = layers.LAYERS_BELOW_FULLSCREEN
+        for layer in search:
+            if layer in hidden:
+                continue
+            for surface in reversed(self.layers[layer]):
+                x, y, width, height = surface.box
+                if not surface.mapped or not (
+                    x <= lx < x + width and y <= ly < y + height
+                ):
+                    continue
+                found, sx, sy = surface.surface_at(lx, ly)
+                if found is not None:
+                    return found, sx, sy
+        return None
+
+    def hand_over_windows(self) -> None:
+        """
+        Move our windows to another output, keeping their order.
+        """
+        fullscreen = self.fullscreen_window
+        self.fullscreen_window = None
+
+        fallback = self.core.outputs[0] if self.core.outputs else None
+        for window in reversed(list(self.windows)):
+            self.remove_window(window)
+            window.output = fallback
+            if fallback is not None:
+                fallback.add_window(window)
+        if fullscreen is not None:
+            fullscreen.set_fullscreen(False)
+        if fallback is not None:
+            fallback.arrange()
+
+    @property
+    def adaptive_sync(self) -> bool:
+        return next_lib.next_output_adaptive_sync_enabled(self.wlr_output._ptr)
+
+    def set_adaptive_sync(self, enabled: bool) -> bool:
+        """
+        Enable or disable variable refresh rate.
+        Returns whether the output ended up in the requested state.
+        """
+        next_lib.wlr_output_enable_adaptive_sync(self.wlr_output._ptr, enabled)
+        if not self.wlr_output.test():
+            self.wlr_output.rollback()
+            log.warning("Output %s rejected adaptive sync", self.wlr_output.name)
+            return False
+
+        try:
+            self.wlr_output.commit()
+        except RuntimeError as e:
+            log.error(
+                "Failed to commit adaptive sync on %s: %s", self.wlr_output.name, e
+            )
+            return False
+        return self.adaptive_sync == enabled
+
+    @property
+    def active_layout_namespace(self) -> str:
+        return self.layout_namespace or self.core.default_layout_namespace
+
+    def layout_windows(self) -> list:
+        """
+        Windows to tile on this output, in layout order.
+        """
+        return [
+            window
+            for window in self.layout_views
+            if window.tags & self.tags and not window.fullscreen
+        ]
+
+    def set_fullscreen_window(self, window) -> None:
+        """
+        Cover the whole output with the given window and hide every other
+        window on it, or go back to the tiled layout if window is None.
+
+        With nothing else visible and no borders, wlroots can scan out the
+        client's buffer directly instead of compositing it.
+        """
+        previous = self.fullscreen_window
+        if window is previous:
+            return
+        self.fullscreen_window = window
+        if previous is not None:
+            previous.set_fullscreen(False)
+
+        for other in self.windows:
+            self.update_visibility(other)
+        self.show_layers_below_fullscreen(window is None)
+        if window is not None:
+            self.core.focus_window(window)
+        self.arrange()
+
+    def show_layers_below_fullscreen(self, show: bool) -> None:
+        # Layer surfaces other than overlays would cover a fullscreen window
+        # or keep wlroots from scanning it out.
+        for layer in layers.LAYERS_BELOW_FULLSCREEN:
+            next_lib.wlr_scene_node_set_enabled(self.layer_trees[layer]._ptr, show)
+
+    def set_tags(self, tags: int) -> None:
+        """
+        Show the windows on the given tags of this output.
+        """
+        if tags == self.tags or not tags:
+            return
+        self.tags = tags
+        self.core.control.emit("tags", output=self)
+        self.drop_hidden_fullscreen()
+        for window in self.windows:
+            self.update_visibility(window)
+        self.refocus()
+        self.arrange()
+
+    def set_window_tags(self, window, tags: int) -> None:
+        if tags == window.tags or not tags:
+            return
+        for tag in tag_bits(window.tags):
+            self.remove_from_tag(window, tag)
+        window.tags = tags
+        for tag in tag_bits(tags):
+            self.tag_stacks.setdefault(tag, WindowStack()).push(window)
+        self.drop_hidden_fullscreen()
+        self.update_visibility(window)
+        self.refocus()
+        self.arrange()
+
+    def drop_hidden_fullscreen(self) -> None:
+        """
+        A fullscreen window that isn't on the tags in view leaves fullscreen,
+        otherwise it would keep covering them.
+        """
+        window = self.fullscreen_window
+        if window is not None and not window.tags & self.tags:
+            window.set_fullscreen(False)
+
+    def refocus(self) -> None:
+        """
+        Move focus to the topmost visible window of this output if the
+        focused window got hidden.
+        """
+        focused = self.core.focus.focused
+        if focused is None or not focused.enabled:
+            self.core.focus_window(
+                next((window for window in self.windows if window.enabled), None)
+            )
+
+    def update_visibility(self, window) -> None:
+        if self.fullscreen_window is not None:
+            window.set_enabled(window is self.fullscreen_window)
+        else:
+            window.set_enabled(bool(window.tags & self.tags))
+
+    def add_window(self, window) -> None:
+        self.update_visibility(window)
+        self.windows.push(window)
+        self.layout_views.push(window)
+        for tag in tag_bits(window.tags):
+            self.tag_stacks.setdefault(tag, WindowStack()).push(window)
+
+    def remove_window(self, window) -> None:
+        self.windows.remove(window)
+        if window is self.fullscreen_window:
+            self.fullscreen_window = None
+            for other in self.windows:
+                self.update_visibility(other)
+            self.show_layers_below_fullscreen(True)
+        self.layout_views.remove(window)
+        for tag in tag_bits(window.tags):
+            self.remove_from_tag(window, tag)
+
+    def remove_from_tag(self, window, tag: int) -> None:
+        stack = self.tag_stacks.get(tag)
+        if stack is not None:
+            stack.remove(window)
+            if not stack:
+                del self.tag_stacks[tag]
+
+    def raise_window(self, window) -> None:
+        self.windows.raise_to_top(window)
+        for tag in tag_bits(window.tags):
+            self.tag_stacks[tag].raise_to_top(window)
+
+    def destroy(self) -> None:
+        if self in self.core.outputs:
+            self.core.outputs.remove(self)
+        else:
+            self.core.disabled_outputs.remove(self)
+        self.core.layout_manager.output_destroyed(self)
+        self.hand_over_windows()
+        self.close_layer_surfaces()
+        for tree in self.layer_trees.values():
+            next_lib.wlr_scene_node_destroy(tree._ptr)
+        self.core.output_config.schedule_update()
+
+        self.render_timer.remove()
         self.destroy_listeners()
 
     def _on_destroy(self, _listener: Listener, _data: Any) -> None:
-        log.debug("Signal: wlr_output_destroy_event")
         self.destroy()
 
     def _on_frame(self, _listener: Listener, _data: Any) -> None:
-        log.debug("Signal: wlr_output_frame_event")
-        scene_output = self.core.scene.get_scene_output(self.wlr_output)
+        delay = self.render_scheduler.delay_ms()
+        if delay:
+            self.render_timer.timer_update(delay)
+        else:
+            self.render()
+
+    def _on_render_timer(self, _data: Any) -> int:
+        self.render()
+        return 0
+
+    def render(self) -> None:
+        # Disabled outputs have no scene output to render to.
+        if self not in self.core.outputs:
+            return
+        self.core.flush_cursor_motion()
+        if self.scene_output is None:
+            self.scene_output = self.core.scene.get_scene_output(self.wlr_output)
+        scene_output = self.scene_output
+        now = Timespec.get_monotonic_time()
+
+        if self.core.transactions.holds(self):
+            # Don't show a half applied layout, a frame gets scheduled once
+            # the transaction is applied.
+            self.core.metrics.incr(Metric.TRANSACTION_FRAMES_HELD)
+            self.frame_done(now)
+            return
+
+        # Nothing changed in the scene and no software cursor moved, only let
+        # clients know the frame happened. Without a commit no further frames
+        # are scheduled until something gets damaged again.
+        if not next_lib.next_scene_output_needs_frame(scene_output._ptr):
+            self.frames_skipped += 1
+            self.core.metrics.incr(Metric.FRAMES_SKIPPED)
+            self.frame_done(now)
+            return
+
+        start = self.core.clock()
         try:
             scene_output.commit()
         except Exception as e:
             log.error("Failed to commit to scene: ", e)
+        else:
+            end = self.core.clock()
+            self.render_scheduler.rendered(end - start)
+            self.frame_timings.committed(end)
+            if not self.core.first_frame_done:
+                self.core.first_frame()
+            self.frames_rendered += 1
+            self.core.metrics.incr(Metric.FRAMES_RENDERED)
+            scanout = next_lib.next_scene_output_scanned_out(scene_output._ptr)
+            if scanout:
+                self.frames_scanned_out += 1
+                self.core.metrics.incr(Metric.FRAMES_SCANNED_OUT)
+            if scanout != self.scanout:
+                self.scanout = scanout
+                log.debug(
+                    "Direct scan-out %s on %s",
+                    "started" if scanout else "stopped",
+                    self.wlr_output.name,
+                )
 
-        # This function is a no-op when hardware cursors are in use.
+        # This function is a no-op when hardware cursors are in use. Held and
+        # skipped frames leave it out, there's no render pass to draw into.
         self.wlr_output.render_software_cursors()
+        self.frame_done(now)
 
-        now = Timespec.get_monotonic_time()
-        scene_output.send_frame_done(now)
+    def frame_done(self, now: Timespec) -> None:
+        self.scene_output.send_frame_done(now)
+
+    def _on_present(self, _listener: Listener, data: Any) -> None:
+        event = next_ffi.cast("struct wlr_output_event_present *", data)
+        when_ns = 0
+        if event.when != next_ffi.NULL:
+            when_ns = event.when.tv_sec * 1_000_000_000 + event.when.tv_nsec
+        self.frame_timings.present(event.presented, when_ns, event.refresh)
+        if event.presented:
+            self.render_scheduler.presented(event.refresh, self.wlr_output.refresh)
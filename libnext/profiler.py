@@ -0,0 +1,84 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import signal
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Any
+
+# Deepest stack recorded per sample.
+MAX_DEPTH = 64
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack on a CPU time interval timer.
+
+    ITIMER_PROF only ticks while the process uses CPU, so time spent waiting
+    in the event loop isn't sampled. Python runs the handler at the next
+    bytecode, a tick that lands in C code is charged to the Python code that
+    runs next.
+    """
+
+    def __init__(self) -> None:
+        self.samples: Counter[tuple[CodeType, ...]] = Counter()
+        self.running: bool = False
+        self.previous_handler: Any = None
+
+    def start(self, interval_ms: int) -> None:
+        if self.running:
+            return
+        self.samples.clear()
+        self.running = True
+        self.previous_handler = signal.signal(signal.SIGPROF, self._on_sample)
+        signal.setitimer(signal.ITIMER_PROF, interval_ms / 1000, interval_ms / 1000)
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler or signal.SIG_DFL)
+
+    def collapsed(self, limit: int | None = None) -> str:
+        """
+        The hottest stacks in the collapsed format flame graph tools read,
+        outermost frame first.
+        """
+        lines = []
+        for stack, count in self.samples.most_common(limit):
+            frames = ";".join(
+                f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                for code in reversed(stack)
+            )
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines)
+
+    def _on_sample(self, _signum: int, frame: FrameType | None) -> None:
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        self.samples[tuple(stack)] += 1
@@ -0,0 +1,44 @@
+import os
+
+from pywayland.protocol import wayland
+from pywayland.protocol_core import Interface
+from pywayland.scanner import Protocol
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROTOCOLS = [
+    os.path.join(ROOT, "protocols", "river-layout-v3.xml"),
+    os.path.join(ROOT, "protocols", "next-control-v1.xml"),
+]
+OUTPUT_DIR = os.path.join(ROOT, "libnext", "_protocols")
+
+# Generated modules import core interfaces from "..wayland", which re-exports
+# the bindings pywayland ships so both sides use the same classes.
+WAYLAND_SHIM = "from pywayland.protocol.wayland import *  # noqa: F401,F403\n"
+
+
+def build(output_dir: str = OUTPUT_DIR) -> None:
+    os.makedirs(os.path.join(output_dir, "wayland"), exist_ok=True)
+    with open(os.path.join(output_dir, "__init__.py"), "w"):
+        pass
+    with open(os.path.join(output_dir, "wayland", "__init__.py"), "w") as f:
+        f.write(WAYLAND_SHIM)
+
+    protocols = [Protocol.parse_file(path) for path in PROTOCOLS]
+    imports = {
+        interface.name: "wayland"
+        for interface in vars(wayland).values()
+        if isinstance(interface, type) and issubclass(interface, Interface)
+    }
+    imports.update(
+        {
+            interface.name: protocol.name
+            for protocol in protocols
+            for interface in protocol.interface
+        }
+    )
+    for protocol in protocols:
+        protocol.output(output_dir, imports)
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,121 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import time
+from collections import deque
+from typing import Callable, Union
+
+# Render times the automatic mode estimates from.
+RENDER_TIME_SAMPLES = 60
+# Headroom on top of the render time estimate in automatic mode.
+RENDER_TIME_SLACK_NS = 1_000_000
+# Delays shorter than this aren't worth a timer.
+MIN_DELAY_MS = 1
+
+# Milliseconds, "auto" or None to render as soon as the frame event fires.
+MaxRenderTime = Union[int, str, None]
+
+
+def parse_max_render_time(value: str) -> MaxRenderTime:
+    """
+    Parse a max render time option: "off", "auto" or milliseconds.
+    """
+    if value == "off":
+        return None
+    if value == "auto":
+        return value
+    milliseconds = int(value)
+    if milliseconds <= 0:
+        raise ValueError("max render time must be positive")
+    return milliseconds
+
+
+class RenderScheduler:
+    """
+    Delays rendering of an output until just before its next vblank, so input
+    that arrives during the refresh period still makes it into the frame.
+
+    With a fixed max render time the frame is started that many milliseconds
+    before the vblank. In automatic mode the budget is the slowest of the
+    recent render times plus some slack.
+    """
+
+    def __init__(
+        self,
+        max_render_time: MaxRenderTime = None,
+        clock: Callable[[], int] = time.monotonic_ns,
+    ) -> None:
+        self.max_render_time = max_render_time
+        self.clock = clock
+        self.render_times: deque[int] = deque(maxlen=RENDER_TIME_SAMPLES)
+        # Last presentation and refresh period, both in nanoseconds.
+        self.last_present_ns: int | None = None
+        self.refresh_ns: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_render_time is not None
+
+    def render_budget_ns(self) -> int | None:
+        if self.max_render_time == "auto":
+            if not self.render_times:
+                return None
+            return max(self.render_times) + RENDER_TIME_SLACK_NS
+        if self.max_render_time is None:
+            return None
+        return int(self.max_render_time) * 1_000_000
+
+    def presented(self, refresh_ns: int, refresh_mhz: int = 0) -> None:
+        """
+        Note a presented frame. The present event arrives right after the
+        vblank, so it's timed with our clock rather than the kernel's and a
+        mocked clock drives everything. Backends that don't report the
+        refresh period, like headless, fall back to the output's refresh
+        rate in mHz.
+        """
+        self.last_present_ns = self.clock()
+        if refresh_ns <= 0 and refresh_mhz > 0:
+            refresh_ns = 1_000_000_000_000 // refresh_mhz
+        self.refresh_ns = refresh_ns
+
+    def rendered(self, duration_ns: int) -> None:
+        self.render_times.append(duration_ns)
+
+    def delay_ms(self) -> int:
+        """
+        Milliseconds to wait before rendering, 0 to render right away.
+        """
+        budget = self.render_budget_ns()
+        if budget is None or self.last_present_ns is None or self.refresh_ns <= 0:
+            return 0
+
+        now = self.clock()
+        elapsed = now - self.last_present_ns
+        if elapsed < 0:
+            return 0
+        # Vblanks may have passed without a present while the output was idle.
+        next_vblank = now + self.refresh_ns - elapsed % self.refresh_ns
+        delay = (next_vblank - budget - now) // 1_000_000
+        return delay if delay >= MIN_DELAY_MS else 0
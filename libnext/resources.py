@@ -0,0 +1,138 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Any, Callable
+
+from pywayland import ffi, lib
+from pywayland.protocol_core.argument import ArgumentType
+from pywayland.protocol_core.message import Message
+from pywayland.protocol_core.resource import Resource
+
+
+class ServerMessage:
+    """
+    Request decoding for server side resources.
+
+    pywayland can't decode new_id arguments on the server and looks object
+    arguments up in its own registry, which fails for objects created by
+    wlroots (wl_output, wl_seat, ...). new_id arguments are turned into
+    resources of the requested interface here and object arguments are passed
+    on as raw `struct wl_resource *`.
+    """
+
+    def __init__(self, message: Message, resource: Resource) -> None:
+        self.message = message
+        self.resource = resource
+        self.name = message.name
+        self.arguments = message.arguments
+
+    def c_to_arguments(self, args_ptr: Any) -> list[Any]:
+        args: list[Any] = []
+        for i, argument in enumerate(self.arguments):
+            arg_ptr = args_ptr[i]
+            match argument.argument_type:
+                case ArgumentType.Int:
+                    args.append(arg_ptr.i)
+                case ArgumentType.Uint:
+                    args.append(arg_ptr.u)
+                case ArgumentType.Fixed:
+                    args.append(lib.wl_fixed_to_double(arg_ptr.f))
+                case ArgumentType.FileDescriptor:
+                    args.append(arg_ptr.h)
+                case ArgumentType.String:
+                    if arg_ptr.s == ffi.NULL:
+                        args.append(None)
+                    else:
+                        args.append(ffi.string(arg_ptr.s).decode())
+                case ArgumentType.Object:
+                    if arg_ptr.o == ffi.NULL:
+                        args.append(None)
+                    else:
+                        args.append(ffi.cast("struct wl_resource *", arg_ptr.o))
+                case ArgumentType.NewId:
+                    assert argument.interface is not None
+                    assert self.resource._ptr is not None
+                    args.append(
+                        argument.interface.resource_class(
+                            lib.wl_resource_get_client(self.resource._ptr),
+                            self.resource.version,
+                            arg_ptr.n,
+                        )
+                    )
+                case ArgumentType.Array:
+                    array_ptr = arg_ptr.a
+                    args.append(ffi.buffer(array_ptr.data, array_ptr.size)[:])
+        return args
+
+
+def setup_resource(
+    resource: Resource, destructor: Callable[[Resource], None] | None = None
+) -> Resource:
+    """
+    Prepare a resource created by the compositor.
+
+    Requests get decoded with ServerMessage, a destroy request destroys the
+    resource, and destructor is called when the resource goes away for any
+    reason, including the client disconnecting. Returns the resource.
+
+    The caller has to keep a reference to the resource until then.
+    """
+    dispatcher = resource.dispatcher
+    dispatcher.messages = [
+        ServerMessage(message, resource) for message in dispatcher.messages
+    ]
+    if any(message.name == "destroy" for message in dispatcher.messages):
+        dispatcher["destroy"] = destroy_resource
+
+    def _on_destroy(resource: Resource) -> None:
+        # libwayland frees the resource right after this.
+        resource._ptr = None
+        if destructor is not None:
+            destructor(resource)
+
+    dispatcher.destructor = _on_destroy
+
+    # pywayland hands its handle to libwayland as user data only, but the
+    # dispatcher gets the implementation pointer, so pass the handle as both.
+    lib.wl_resource_set_dispatcher(
+        resource._ptr,
+        lib.dispatcher_func,
+        resource._handle,
+        resource._handle,
+        lib.resource_destroy_func,
+    )
+    return resource
+
+
+def destroy_resource(resource: Resource) -> None:
+    resource.destroy()
+
+
+def resource_client(resource: Resource) -> Any:
+    """
+    The `struct wl_client *` owning a resource.
+    """
+    assert resource._ptr is not None
+    return lib.wl_resource_get_client(resource._ptr)
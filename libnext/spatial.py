@@ -0,0 +1,100 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Generic, Hashable, Iterator, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+# Box as (x, y, width, height) in layout coordinates.
+Box = tuple[int, int, int, int]
+
+
+class SpatialIndex(Generic[T]):
+    """
+    Uniform grid over layout coordinates.
+
+    Every cell holds the items whose box overlaps it, so a point query only
+    looks at the handful of items sharing the cell under the point instead of
+    every mapped window on every output.
+    """
+
+    def __init__(self, cell_size: int = 256) -> None:
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], set[T]] = {}
+        self.boxes: dict[T, Box] = {}
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def __contains__(self, item: T) -> bool:
+        return item in self.boxes
+
+    def _cells(self, box: Box) -> Iterator[tuple[int, int]]:
+        x, y, width, height = box
+        size = self.cell_size
+        for cell_x in range(x // size, (x + max(width, 1) - 1) // size + 1):
+            for cell_y in range(y // size, (y + max(height, 1) - 1) // size + 1):
+                yield cell_x, cell_y
+
+    def insert(self, item: T, x: int, y: int, width: int, height: int) -> None:
+        """
+        Add an item or move it to a new box.
+        """
+        box = (x, y, width, height)
+        old_box = self.boxes.get(item)
+        if old_box == box:
+            return
+        if old_box is not None:
+            self.remove(item)
+
+        self.boxes[item] = box
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, set()).add(item)
+
+    def remove(self, item: T) -> None:
+        box = self.boxes.pop(item, None)
+        if box is None:
+            return
+        for cell in self._cells(box):
+            bucket = self.cells[cell]
+            bucket.discard(item)
+            if not bucket:
+                del self.cells[cell]
+
+    def query(self, x: float, y: float) -> list[T]:
+        """
+        Items whose box contains the point.
+        """
+        size = self.cell_size
+        bucket = self.cells.get((int(x // size), int(y // size)))
+        if not bucket:
+            return []
+
+        items = []
+        for item in bucket:
+            box_x, box_y, width, height = self.boxes[item]
+            if box_x <= x < box_x + width and box_y <= y < box_y + height:
+                items.append(item)
+        return items
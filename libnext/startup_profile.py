@@ -0,0 +1,73 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import time
+
+
+def process_start_ns() -> int:
+    """
+    When this process was started, on the monotonic clock. Falls back to now
+    without procfs.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name can hold spaces, fields are counted after it.
+            fields = f.read().rpartition(")")[2].split()
+    except OSError:
+        return time.monotonic_ns()
+
+    # starttime is in clock ticks since boot.
+    started = int(fields[19]) * 1_000_000_000 // os.sysconf("SC_CLK_TCK")
+    age = time.clock_gettime_ns(time.CLOCK_BOOTTIME) - started
+    return time.monotonic_ns() - max(age, 0)
+
+
+class StartupProfile:
+    """
+    Timestamps of the startup phases, from process start to the first
+    committed frame.
+    """
+
+    def __init__(self, start_ns: int | None = None) -> None:
+        self.start_ns = process_start_ns() if start_ns is None else start_ns
+        self.marks: list[tuple[str, int]] = []
+
+    def mark(self, phase: str) -> None:
+        """
+        Record the end of a phase, it started where the previous one ended.
+        """
+        self.marks.append((phase, time.monotonic_ns()))
+
+    def report(self) -> str:
+        lines = [f"{'phase':<24}{'ms':>10}{'total ms':>12}"]
+        previous = self.start_ns
+        for phase, when in self.marks:
+            lines.append(
+                f"{phase:<24}{(when - previous) / 1e6:>10.1f}"
+                f"{(when - self.start_ns) / 1e6:>12.1f}"
+            )
+            previous = when
+        return "\n".join(lines)
@@ -0,0 +1,157 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import logging
+from typing import Any
+
+from libnext._wlroots import lib as next_lib
+from libnext.metrics import Metric
+from libnext.window import WindowType
+
+log = logging.getLogger("Next: Transaction")
+
+# How long to wait for clients to commit a configure before applying anyway.
+TRANSACTION_TIMEOUT_MS = 200
+
+# (x, y, width, height) in layout coordinates.
+Box = tuple[int, int, int, int]
+
+
+class TransactionManager:
+    """
+    Applies window geometry changes atomically.
+
+    Geometry queued with configure() is sent to the clients on commit(). The
+    new positions are only applied, all in one scene update, once every
+    resized client committed a buffer for its configure or the timeout hits.
+    Outputs showing windows of the transaction in flight don't render until
+    it's applied, so a layout change shows up as one clean frame instead of
+    several half updated ones. Other outputs keep rendering.
+    """
+
+    def __init__(self, core) -> None:
+        self.core = core
+        # Geometry collected for the next transaction.
+        self.pending: dict[WindowType, Box] = {}
+        # The transaction in flight and the windows it's waiting on.
+        self.inflight: dict[WindowType, Box] = {}
+        self.waiting: set[WindowType] = set()
+        # Outputs the windows in flight are on, see holds().
+        self.held_outputs: set = set()
+        self.timer = core.event_loop.add_timer(self._on_timeout)
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.inflight)
+
+    def holds(self, output) -> bool:
+        """
+        Whether frames of an output wait on the transaction in flight.
+        """
+        return output in self.held_outputs
+
+    def destroy(self) -> None:
+        self.timer.remove()
+
+    def configure(
+        self, window: WindowType, x: int, y: int, width: int, height: int
+    ) -> None:
+        self.pending[window] = (x, y, width, height)
+
+    def commit(self) -> None:
+        """
+        Send the pending configures, unless a transaction is already in
+        flight in which case they go out once it's done.
+        """
+        if self.inflight or not self.pending:
+            return
+
+        self.core.metrics.incr(Metric.TRANSACTIONS)
+        self.inflight, self.pending = self.pending, {}
+        self.held_outputs = {
+            window.output for window in self.inflight if window.output is not None
+        }
+        for window, (x, y, width, height) in self.inflight.items():
+            if window.configure(x, y, width, height):
+                self.waiting.add(window)
+
+        if self.waiting:
+            self.timer.timer_update(TRANSACTION_TIMEOUT_MS)
+        else:
+            self.apply()
+
+    def committed(self, window: WindowType) -> None:
+        """
+        Called by windows when the client committed the configure it's
+        waiting on.
+        """
+        if window in self.waiting:
+            self.waiting.remove(window)
+            if not self.waiting:
+                self.timer.timer_update(0)
+                self.apply()
+
+    def forget(self, window: WindowType) -> None:
+        """
+        Drop a window that's going away from any transaction.
+        """
+        self.pending.pop(window, None)
+        if self.inflight.pop(window, None) is None:
+            return
+
+        if self.inflight:
+            self.committed(window)
+        else:
+            self.timer.timer_update(0)
+            self.waiting.clear()
+            self.release_outputs()
+            self.commit()
+
+    def apply(self) -> None:
+        for window, (x, y, width, height) in self.inflight.items():
+            if window.mapped:
+                window.apply_geometry(x, y, width, height)
+                if window.output is not None:
+                    self.held_outputs.add(window.output)
+        self.inflight = {}
+        self.waiting.clear()
+        self.release_outputs()
+
+        # Geometry that was queued while this transaction was in flight.
+        self.commit()
+
+    def release_outputs(self) -> None:
+        # Frames were held back meanwhile, make sure the result gets drawn.
+        outputs, self.held_outputs = self.held_outputs, set()
+        for output in outputs:
+            if output in self.core.outputs:
+                next_lib.wlr_output_schedule_frame(output.wlr_output._ptr)
+
+    def _on_timeout(self, _data: Any) -> int:
+        if self.inflight:
+            log.debug("Transaction timed out waiting on %d windows", len(self.waiting))
+            self.core.metrics.incr(Metric.TRANSACTION_TIMEOUTS)
+            self.apply()
+        return 0
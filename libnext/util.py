@@ -22,24 +22,99 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
 # EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from typing import Callable, Union
+import logging
+import time
+from typing import Any, Callable, Union
 
 from pywayland.server import Listener, Signal
+from wlroots import ffi
+
+from libnext.metrics import listener_metrics
 
 ColorType = Union[str, tuple[int, int, int], tuple[int, int, int, float]]
 
+# Parsed colors handed out by color(), oldest entries are dropped first.
+COLOR_CACHE_SIZE = 64
+_color_cache: dict[Any, ffi.CData] = {}
+
+trace_log = logging.getLogger("Next: Trace")
+
+# Decided once at startup, see set_tracing() and set_listener_metrics().
+_tracing: bool = False
+_listener_metrics: bool = False
+
+
+def set_tracing(enabled: bool) -> None:
+    """
+    Wrap listeners registered from now on in tracing callbacks.
+    When disabled listeners are registered bare and cost nothing extra.
+    """
+    global _tracing
+    _tracing = enabled
+
+
+def set_listener_metrics(enabled: bool) -> None:
+    """
+    Count and time listeners registered from now on in listener_metrics.
+    When disabled listeners are registered bare and cost nothing extra.
+    """
+    global _listener_metrics
+    _listener_metrics = enabled
+
+
+def traced(callback: Callable) -> Callable:
+    """
+    Wrap a listener callback so every call emits a structured trace record.
+
+    The record is passed as extra attributes on the log record: listener,
+    timestamp_ns (CLOCK_MONOTONIC on entry) and duration_ns.
+    """
+    name = callback.__qualname__
+
+    def _traced(listener: Listener, data: Any) -> None:
+        start = time.monotonic_ns()
+        callback(listener, data)
+        duration = time.monotonic_ns() - start
+        trace_log.debug(
+            "listener=%s timestamp_ns=%d duration_ns=%d",
+            name,
+            start,
+            duration,
+            extra={"listener": name, "timestamp_ns": start, "duration_ns": duration},
+        )
+
+    return _traced
+
+
+def serial_reached(current: int, target: int) -> bool:
+    """
+    Whether a 32 bit serial is at or past target, allowing for wrap around.
+    """
+    return (current - target) & 0xFFFFFFFF < 0x80000000
+
 
 class Listeners:
-    def add_listener(self, event: Signal, callback: Callable) -> None:
+    def add_listener(self, event: Signal, callback: Callable) -> Listener:
         """
-        Add a listener to any event.
+        Add a listener to any event. With set_listener_metrics() its calls
+        are counted and timed in listener_metrics.
         """
         if not hasattr(self, "listeners"):
             self.listeners = []
 
-        listener = Listener(callback)
+        if _listener_metrics:
+            callback = listener_metrics.measured(callback)
+        listener = Listener(traced(callback) if _tracing else callback)
         event.add(listener)
         self.listeners.append(listener)
+        return listener
+
+    def remove_listener(self, listener: Listener) -> None:
+        """
+        Remove a listener added with add_listener() before the others go.
+        """
+        listener.remove()
+        self.listeners.remove(listener)
 
     def destroy_listeners(self) -> None:
         """
@@ -80,6 +155,23 @@ def rgb(x: ColorType) -> tuple[float, float, float, float]:
     raise ValueError("Invalid RGB specifier.")
 
 
+def color(x: ColorType | ffi.CData) -> ffi.CData:
+    """
+    A float[4] for a color, shared between everyone asking for the same
+    color so focus changes and borders don't allocate. Don't write to it.
+    """
+    if isinstance(x, ffi.CData):
+        return x
+
+    key = tuple(x) if isinstance(x, list) else x
+    cdata = _color_cache.get(key)
+    if cdata is None:
+        if len(_color_cache) >= COLOR_CACHE_SIZE:
+            del _color_cache[next(iter(_color_cache))]
+        cdata = _color_cache[key] = ffi.new("float[4]", rgb(x))
+    return cdata
+
+
 def hex(x: ColorType) -> str:
     r, g, b, _ = rgb(x)
     return "#%02x%02x%02x" % (int(r * 255), int(g * 255), int(b * 255))
@@ -22,8 +22,8 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
 # EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import functools
 import logging
+from abc import ABC, abstractmethod
 from typing import Any, Generic, TypeVar, Union
 
 import pywayland
@@ -39,7 +39,11 @@ from wlroots.wlr_types.xdg_shell import (
 )
 
 from libnext import util
-from libnext.util import Listeners
+from libnext._wlroots import lib as next_lib
+from libnext.borders import Borders
+from libnext.metrics import Metric
+from libnext.outputs import NextOutput
+from libnext.util import Listeners, serial_reached
 
 EDGES_TILED = Edges.TOP | Edges.BOTTOM | Edges.LEFT | Edges.RIGHT
 EDGES_FLOAT = Edges.NONE
@@ -48,14 +52,7 @@ Surface = TypeVar("Surface", bound=PtrHasData)
 log = logging.getLogger("Next: Window")
 
 
-@functools.lru_cache()
-def rgb(color: util.ColorType) -> ffi.CData:
-    if isinstance(color, ffi.CData):
-        return color
-    return ffi.new("float[4]", util.rgb(color))
-
-
-class Window(Generic[Surface], Listeners):
+class Window(Generic[Surface], Listeners, ABC):
     """
     Generic class for windows.
     """
@@ -64,7 +61,8 @@ class Window(Generic[Surface], Listeners):
         self.core = core
         self.surface = surface
         self.mapped: bool = False
-        self.scene_node: SceneNode
+        # Stable id for control clients, see libnext.commands.
+        self.wid: int = next(core.window_ids)
 
         self.x = 0
         self.y = 0
@@ -73,42 +71,216 @@ class Window(Generic[Surface], Listeners):
         self.height: int = 0
         self.float_height: int = 0
         self.opacity: float = 1.0
+        # Stacking order stamp, see NextCore.window_at().
+        self.z_index: int = 0
+
+        self.output: NextOutput | None = None
+        # Bit mask of the tags this window is on.
+        self.tags: int = 1
 
         self.borderwidth: int = 0
-        self.bordercolor: list[ffi.CData] = [rgb((0, 0, 0, 1))]
+        self.bordercolor: list[ffi.CData] = [core.border_color_normal]
+        self.bordercolor_spec: util.ColorType | list | None = None
+        self.activated: bool = False
+        # Whether the scene node is shown, see NextOutput.set_fullscreen_window().
+        self.enabled: bool = True
+        self.fullscreen: bool = False
+        # NOTE: Do we really need this?
+        self.maximized: bool = False
+
+        # The window's scene tree holds the surface tree and the borders.
+        self.scene_node = SceneNode(
+            next_lib.next_scene_tree_create(self.core.window_tree._ptr)
+        )
+        self.surface_node: SceneNode | None = None
+        self.borders: Borders | None = Borders(self.scene_node, self.bordercolor[0])
+
+        # Last geometry and border width passed to place() and last size sent
+        # to the client, so repeated placements don't reach the client or
+        # wlroots.
+        self.placed: tuple[int, int, int, int, int] | None = None
+        self.sent_size: tuple[int, int] | None = None
 
         self.name: str = "<No Name>"
         self.wm_class: str | None = None
 
-        surface.data = (
-            self.ftm_handle
-        ) = self.core.foreign_toplevel_managerv1.create_handle()
+        surface.data = self.ftm_handle = (
+            self.core.foreign_toplevel_managerv1.create_handle()
+        )
+        # foreign_toplevel_management_v1 callbacks.
+        self.add_listener(
+            self.ftm_handle.request_maximize_event,
+            self._on_foreign_request_maximize,
+        )
+        self.add_listener(
+            self.ftm_handle.request_fullscreen_event,
+            self._on_foreign_request_fullscreen,
+        )
 
     def destroy(self) -> None:
         self.destroy_listeners()
         self.ftm_handle.destroy()
+        next_lib.wlr_scene_node_destroy(self.scene_node._ptr)
+
+    def map_toplevel(self) -> None:
+        """
+        Manage a window that just got mapped and focus it, unless a
+        fullscreen window covers its output.
+        """
+        self.set_enabled(True)
+        self.core.manage_window(self)
+        output = self.output
+        if self.fullscreen and output is not None:
+            output.set_fullscreen_window(self)
+        elif output is None or output.fullscreen_window is None:
+            self.core.focus_window(self)
+
+    def unmap_toplevel(self) -> None:
+        """
+        Stop managing a window that got unmapped. Its scene tree is hidden so
+        the borders don't stay behind.
+        """
+        self.mapped = False
+        self.placed = None
+        self.core.unmanage_window(self)
+        self.set_enabled(False)
+
+    @abstractmethod
+    def configure(self, x: int, y: int, width: int, height: int) -> bool:
+        """
+        Ask the client for a new geometry, the size given includes the borders.
+        Returns whether a configure was sent that has to be waited on.
+        """
+
+    def activate(self, active: bool) -> None:
+        """
+        Set the activated state of the surface and its foreign toplevel handle.
+        """
+        self.activated = active
+        self.surface.set_activated(active)
+        self.ftm_handle.set_activated(active)
+        self.update_border_color()
+
+    def update_border_color(self) -> None:
+        if self.borders is not None:
+            if self.activated:
+                self.borders.set_color(self.core.border_color_focused)
+            else:
+                self.borders.set_color(self.bordercolor[0])
+
+    def set_enabled(self, enabled: bool) -> None:
+        """
+        Show or hide the window, hidden windows can't be found by window_at().
+        """
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        next_lib.wlr_scene_node_set_enabled(self.scene_node._ptr, enabled)
+        if enabled:
+            self.core.window_index.insert(self, self.x, self.y, self.width, self.height)
+        else:
+            self.core.window_index.remove(self)
 
     def set_border(self, color: util.ColorType | None, width: int) -> None:
         # NOTE: Does this need anything else? Check qtile.
+        if width == self.borderwidth and (not color or color == self.bordercolor_spec):
+            return
+
         if color:
+            self.bordercolor_spec = color
             if isinstance(color, list):
-                self.bordercolor = [rgb(c) for c in color]
+                self.bordercolor = [util.color(c) for c in color]
             else:
-                self.bordercolor = [rgb(color)]
+                self.bordercolor = [util.color(color)]
+            self.update_border_color()
         self.borderwidth = width
 
+    def apply_geometry(self, x: int, y: int, width: int, height: int) -> None:
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.scene_node.set_position(x, y)
+        if self.surface_node is not None:
+            self.surface_node.set_position(self.borderwidth, self.borderwidth)
+        if self.borders is not None:
+            self.borders.set_geometry(width, height, self.borderwidth)
+        if self.enabled:
+            self.core.window_index.insert(self, x, y, width, height)
+
+    def place(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        borderwidth: int,
+        bordercolor: util.ColorType | None,
+        above: bool = False,
+        margin: int | list[int] | None = None,
+        respect_hints: bool = False,
+    ) -> None:
+        if margin is not None:
+            if isinstance(margin, int):
+                margin = [margin] * 4
+            x += margin[3]
+            y += margin[0]
+            width -= margin[1] + margin[3]
+            height -= margin[0] + margin[2]
+        # TODO: This is incomplete. Finish this.
+
+        self.set_border(bordercolor, borderwidth)
+        placed = (x, y, int(width), int(height), self.borderwidth)
+        if placed == self.placed:
+            self.core.metrics.incr(Metric.CONFIGURES_SUPPRESSED)
+        else:
+            self.placed = placed
+            # Applied by the transaction manager, see TransactionManager.commit().
+            self.core.transactions.configure(self, x, y, int(width), int(height))
+
+        if above:
+            self.core.focus_window(self)
+
+    def set_fullscreen(self, fullscreen: bool) -> None:
+        """
+        Enter or leave fullscreen, the output does the placement.
+        """
+        if fullscreen == self.fullscreen:
+            return
+        self.fullscreen = fullscreen
+        self.surface.set_fullscreen(fullscreen)
+        self.ftm_handle.set_fullscreen(fullscreen)
+
+        output = self.output
+        if output is None or not self.mapped:
+            return
+        if fullscreen:
+            output.set_fullscreen_window(self)
+        elif output.fullscreen_window is self:
+            output.set_fullscreen_window(None)
+
+    def _on_foreign_request_maximize(
+        self,
+        _listener: Listener,
+        event: foreign_toplevel_management_v1.ForeignToplevelHandleV1MaximizedEvent,
+    ) -> None:
+        self.maximized = event.maximized
+
+    def _on_foreign_request_fullscreen(
+        self,
+        _listener: Listener,
+        event: foreign_toplevel_management_v1.ForeignToplevelHandleV1FullscreenEvent,
+    ) -> None:
+        self.set_fullscreen(event.fullscreen)
+
     def _on_destroy(self, _listener: Listener, _data: Any) -> None:
         """
         Window destroy callback.
         """
-        log.debug("Signal: window_destroy_event")
         if self.mapped:
             log.warn("Window destroy signal sent before unmap event.")
             self.mapped = False
-            self.core.mapped_windows.remove(self)
-            # Focus on the next window.
-            if len(self.core.mapped_windows) >= 1:
-                self.core.focus_window(self.core.mapped_windows[-1])
+            self.core.unmanage_window(self)
 
         if self in self.core.pending_windows:
             self.core.pending_windows.remove(self)
@@ -130,20 +302,26 @@ class XdgWindow(Window[XdgSurface]):
         self.wm_class = surface.toplevel.app_id
         self.popups: list[XdgPopupWindow] = []
         self.subsurfaces: list[SubSurface] = []
-        self.scene_node = SceneNode.xdg_surface_create(self.core.scene.node, surface)
+        self.surface_node = SceneNode.xdg_surface_create(self.scene_node, surface)
 
-        self.fullscreen: bool = False
-        # NOTE: Do we really need this?
-        self.maximized: bool = False
+        # Serial of the configure a transaction is waiting on.
+        self.configure_serial: int | None = None
 
         # TODO: Finish this.
         self.add_listener(self.surface.destroy_event, self._on_destroy)
         self.add_listener(self.surface.map_event, self._on_map)
         self.add_listener(self.surface.new_popup_event, self._on_new_popup)
         self.add_listener(self.surface.unmap_event, self._on_unmap)
+        self.add_listener(self.surface.surface.commit_event, self._on_commit)
+        # Toplevel listeners, added once as the window can be mapped again.
+        self.add_listener(
+            self.surface.toplevel.request_fullscreen_event,
+            self._on_request_fullscreen,
+        )
+        self.add_listener(self.surface.toplevel.set_title_event, self._on_set_title)
+        self.add_listener(self.surface.toplevel.set_app_id_event, self._on_set_app_id)
 
     def _on_map(self, _listener: Listener, _data: Any) -> None:
-        log.debug("Signal: wlr_xdg_surface_map_event")
         if self in self.core.pending_windows:
             log.debug("Managing a new top-level window")
             self.core.pending_windows.remove(self)
@@ -152,6 +330,7 @@ class XdgWindow(Window[XdgSurface]):
             geometry = self.surface.get_geometry()
             self.width = self.float_width = geometry.width
             self.height = self.float_height = geometry.height
+            self.sent_size = (self.width, self.height)
 
             self.surface.set_tiled(EDGES_TILED)
 
@@ -162,30 +341,7 @@ class XdgWindow(Window[XdgSurface]):
             if self.wm_class:
                 self.ftm_handle.set_app_id(self.wm_class or "")
 
-            # TODO: Toplevel listeners go here.
-            self.add_listener(
-                self.surface.toplevel.request_fullscreen_event,
-                self._on_request_fullscreen,
-            )
-            self.add_listener(self.surface.toplevel.set_title_event, self._on_set_title)
-            self.add_listener(
-                self.surface.toplevel.set_app_id_event, self._on_set_app_id
-            )
-            # foreign_toplevel_management_v1 callbacks.
-            self.add_listener(
-                self.ftm_handle.request_maximize_event,
-                self._on_foreign_request_maximize,
-            )
-            self.add_listener(
-                self.ftm_handle.request_fullscreen_event,
-                self._on_foreign_request_fullscreen,
-            )
-
-            self.core.mapped_windows.append(self)
-            self.core.focus_window(self)
-            # TODO: Remove this before first release candidate.
-            # This is only here for testing.
-            self.place(0, 0, 1920, 1080, 0, None, True, None, False)
+            self.map_toplevel()
 
     def get_pid(self) -> int:
         pid = pywayland.ffi.new("pid_t *")
@@ -197,72 +353,32 @@ class XdgWindow(Window[XdgSurface]):
     def kill(self) -> None:
         self.surface.send_close()
 
-    def place(
-        self,
-        x: int,
-        y: int,
-        width: int,
-        height: int,
-        borderwidth: int,
-        bordercolor: util.ColorType | None,
-        above: bool = False,
-        margin: int | list[int] | None = None,
-        respect_hints: bool = False,
-    ) -> None:
-        if margin is not None:
-            if isinstance(margin, int):
-                margin = [margin] * 4
-            x += margin[3]
-            y += margin[0]
-            width -= margin[1] + margin[3]
-            height -= margin[0] + margin[2]
-        # TODO: This is incomplete. Finish this.
-
-        self.x = x
-        self.y = y
-        self.width = int(width)
-        self.height = int(height)
-        self.surface.set_size(self.width, self.height)
-        self.scene_node.set_position(self.x, self.y)
-        self.set_border(bordercolor, borderwidth)
-
-        if above:
-            self.core.focus_window(self)
-
-    def _on_foreign_request_maximize(
-        self,
-        _listener: Listener,
-        event: foreign_toplevel_management_v1.ForeignToplevelHandleV1MaximizedEvent,
-    ) -> None:
-        log.debug("Signal: wlr_foreign_toplevel_management_request_maximize")
-        self.maximized = event.maximized
-
-    def _on_foreign_request_fullscreen(
-        self,
-        _listener: Listener,
-        event: foreign_toplevel_management_v1.ForeignToplevelHandleV1FullscreenEvent,
-    ) -> None:
-        log.debug("Signal: wlr_foreign_toplevel_management_request_fullscreen")
-        self.borderwidth = 0
-        self.fullscreen = event.fullscreen
+    def configure(self, _x: int, _y: int, width: int, height: int) -> bool:
+        width = max(width - 2 * self.borderwidth, 1)
+        height = max(height - 2 * self.borderwidth, 1)
+        if (width, height) == self.sent_size:
+            self.core.metrics.incr(Metric.CONFIGURES_SUPPRESSED)
+            return False
+        self.sent_size = (width, height)
+        self.configure_serial = self.surface.set_size(width, height)
+        self.core.metrics.incr(Metric.CONFIGURES_SENT)
+        return True
 
     def _on_request_fullscreen(
         self, _listener: Listener, event: XdgTopLevelSetFullscreenEvent
     ) -> None:
-        log.debug("Signal: wlr_xdg_surface_toplevel_request_fullscreen")
-        self.borderwidth = 0
-        self.fullscreen = event.fullscreen
+        self.set_fullscreen(event.fullscreen)
 
     def _on_set_title(self, _listener: Listener, _data: Any) -> None:
-        log.debug("Signal: wlr_xdg_surface_toplevel_set_title")
         title = self.surface.toplevel.title
 
         if title and title != self.name:
             self.name = title
             self.ftm_handle.set_title(self.name)
+            if self.mapped:
+                self.core.control.emit("window-title", window=self)
 
     def _on_set_app_id(self, _listener: Listener, _data: Any) -> None:
-        log.debug("Signal: wlr_xdg_surface_toplevel_set_app_id")
         self.wm_class = self.surface.toplevel.app_id
 
         if (
@@ -271,18 +387,21 @@ class XdgWindow(Window[XdgSurface]):
         ):
             self.ftm_handle.set_app_id(self.wm_class or "")
 
+    def _on_commit(self, _listener: Listener, _data: Any) -> None:
+        serial = self.configure_serial
+        if serial is not None and serial_reached(
+            self.surface._ptr.current.configure_serial, serial
+        ):
+            self.configure_serial = None
+            self.core.transactions.committed(self)
+
     def _on_new_popup(self, _listener: Listener, xdg_popup: XdgPopup) -> None:
-        log.debug("Signal: wlr_xdg_surface_new_popup_event")
         self.popups.append(XdgPopupWindow(self, xdg_popup))
 
     def _on_unmap(self, _listener: Listener, _data: Any) -> None:
-        log.debug("Signal: wlr_xdg_surface_unmap_event")
-        self.mapped = False
-        self.core.mapped_windows.remove(self)
-
-        # Focus on the next window.
-        if len(self.core.mapped_windows) >= 1:
-            self.core.focus_window(self.core.mapped_windows[-1])
+        self.unmap_toplevel()
+        # Toplevels can be mapped again after being unmapped.
+        self.core.pending_windows.add(self)
 
 
 class XdgPopupWindow(Listeners):
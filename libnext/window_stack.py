@@ -0,0 +1,144 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Generic, Hashable, Iterator, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class WindowStack(Generic[T]):
+    """
+    Doubly linked ring of windows, ordered from top (most recently raised or
+    focused) to bottom.
+
+    Links are kept in dicts keyed by the window itself so membership, remove,
+    raise and rotate are all O(1). Iteration goes from the top downwards.
+    """
+
+    def __init__(self) -> None:
+        self.top: T | None = None
+        self.below: dict[T, T] = {}
+        self.above: dict[T, T] = {}
+
+    def __len__(self) -> int:
+        return len(self.below)
+
+    def __bool__(self) -> bool:
+        return self.top is not None
+
+    def __contains__(self, item: T) -> bool:
+        return item in self.below
+
+    def __iter__(self) -> Iterator[T]:
+        item = self.top
+        for _ in range(len(self.below)):
+            assert item is not None
+            yield item
+            item = self.below[item]
+
+    @property
+    def bottom(self) -> T | None:
+        if self.top is None:
+            return None
+        return self.above[self.top]
+
+    def push(self, item: T) -> None:
+        """
+        Insert a window on top of the stack.
+        """
+        if item in self.below:
+            self.raise_to_top(item)
+            return
+
+        if self.top is None:
+            self.below[item] = self.above[item] = item
+        else:
+            bottom = self.above[self.top]
+            self.below[item] = self.top
+            self.above[item] = bottom
+            self.above[self.top] = item
+            self.below[bottom] = item
+        self.top = item
+
+    def remove(self, item: T) -> None:
+        """
+        Remove a window, the one below it becomes the top if it was on top.
+        Windows not in the stack are ignored.
+        """
+        below = self.below.pop(item, None)
+        if below is None:
+            return
+        above = self.above.pop(item)
+
+        if below == item:
+            self.top = None
+            return
+
+        self.below[above] = below
+        self.above[below] = above
+        if self.top == item:
+            self.top = below
+
+    def raise_to_top(self, item: T) -> None:
+        if self.top == item:
+            return
+        self.remove(item)
+        self.push(item)
+
+    def rotate(self, steps: int = 1) -> T | None:
+        """
+        Rotate the ring without relinking anything and return the new top.
+        Positive steps send the top window to the bottom, negative steps bring
+        the bottom window to the top.
+        """
+        if self.top is not None:
+            links = self.below if steps > 0 else self.above
+            for _ in range(abs(steps)):
+                self.top = links[self.top]
+        return self.top
+
+    def next_after(self, item: T) -> T:
+        """
+        The window below the given one, wrapping around at the bottom.
+        """
+        return self.below[item]
+
+    def previous_before(self, item: T) -> T:
+        """
+        The window above the given one, wrapping around at the top.
+        """
+        return self.above[item]
+
+
+def tag_bits(tags: int) -> Iterator[int]:
+    """
+    Indices of the bits set in a tag mask.
+    """
+    index = 0
+    while tags:
+        if tags & 1:
+            yield index
+        tags >>= 1
+        index += 1
@@ -0,0 +1,135 @@
+import wlroots.ffi_build as wlr
+from cffi import FFI
+
+# wlroots API that pywlroots does not bind yet.
+CDEF = """
+void wlr_output_schedule_frame(struct wlr_output *output);
+struct wlr_output *wlr_output_from_resource(struct wl_resource *resource);
+void wlr_output_enable_adaptive_sync(struct wlr_output *output, bool enabled);
+
+struct wlr_output_event_present {
+    struct wlr_output *output;
+    bool presented;
+    struct timespec *when;
+    unsigned seq;
+    int refresh;
+    ...;
+};
+
+struct wlr_presentation *wlr_presentation_create(struct wl_display *display,
+    struct wlr_backend *backend);
+void wlr_scene_set_presentation(struct wlr_scene *scene,
+    struct wlr_presentation *presentation);
+
+struct wlr_scene_rect { ...; };
+struct wlr_scene_rect *wlr_scene_rect_create(struct wlr_scene_node *parent,
+    int width, int height, const float color[4]);
+void wlr_scene_rect_set_size(struct wlr_scene_rect *rect, int width, int height);
+void wlr_scene_rect_set_color(struct wlr_scene_rect *rect, const float color[4]);
+void wlr_scene_node_destroy(struct wlr_scene_node *node);
+void wlr_scene_node_set_enabled(struct wlr_scene_node *node, bool enabled);
+void wlr_scene_node_reparent(struct wlr_scene_node *node,
+    struct wlr_scene_node *new_parent);
+struct wlr_scene_node *wlr_scene_subsurface_tree_create(
+    struct wlr_scene_node *parent, struct wlr_surface *surface);
+
+bool next_output_adaptive_sync_enabled(struct wlr_output *output);
+struct wlr_scene_node *next_scene_tree_create(struct wlr_scene_node *parent);
+struct wlr_scene_node *next_scene_rect_node(struct wlr_scene_rect *rect);
+bool next_scene_output_needs_frame(struct wlr_scene_output *scene_output);
+bool next_scene_output_scanned_out(struct wlr_scene_output *scene_output);
+
+void next_headless_pointer_motion(struct wlr_input_device *device,
+    uint32_t time_msec, double delta_x, double delta_y);
+
+void next_headless_pointer_button(struct wlr_input_device *device,
+    uint32_t time_msec, uint32_t button, bool pressed);
+
+void next_headless_pointer_frame(struct wlr_input_device *device);
+
+void next_headless_keyboard_key(struct wlr_input_device *device,
+    uint32_t time_msec, uint32_t keycode, bool pressed);
+"""
+
+SOURCE = """
+#include <wlr/interfaces/wlr_keyboard.h>
+#include <wlr/types/wlr_presentation_time.h>
+
+static bool next_output_adaptive_sync_enabled(struct wlr_output *output) {
+    return output->adaptive_sync_status == WLR_OUTPUT_ADAPTIVE_SYNC_ENABLED;
+}
+
+static struct wlr_scene_node *next_scene_tree_create(
+        struct wlr_scene_node *parent) {
+    struct wlr_scene_tree *tree = wlr_scene_tree_create(parent);
+    return tree == NULL ? NULL : &tree->node;
+}
+
+static struct wlr_scene_node *next_scene_rect_node(struct wlr_scene_rect *rect) {
+    return &rect->node;
+}
+
+static bool next_scene_output_needs_frame(struct wlr_scene_output *scene_output) {
+    return scene_output->output->needs_frame
+        || pixman_region32_not_empty(&scene_output->damage->current);
+}
+
+static bool next_scene_output_scanned_out(struct wlr_scene_output *scene_output) {
+    return scene_output->prev_scanout;
+}
+
+static void next_headless_pointer_motion(struct wlr_input_device *device,
+        uint32_t time_msec, double delta_x, double delta_y) {
+    struct wlr_event_pointer_motion event = {
+        .device = device,
+        .time_msec = time_msec,
+        .delta_x = delta_x,
+        .delta_y = delta_y,
+        .unaccel_dx = delta_x,
+        .unaccel_dy = delta_y,
+    };
+    wl_signal_emit(&device->pointer->events.motion, &event);
+}
+
+static void next_headless_pointer_button(struct wlr_input_device *device,
+        uint32_t time_msec, uint32_t button, bool pressed) {
+    struct wlr_event_pointer_button event = {
+        .device = device,
+        .time_msec = time_msec,
+        .button = button,
+        .state = pressed ? WLR_BUTTON_PRESSED : WLR_BUTTON_RELEASED,
+    };
+    wl_signal_emit(&device->pointer->events.button, &event);
+}
+
+static void next_headless_pointer_frame(struct wlr_input_device *device) {
+    wl_signal_emit(&device->pointer->events.frame, device->pointer);
+}
+
+static void next_headless_keyboard_key(struct wlr_input_device *device,
+        uint32_t time_msec, uint32_t keycode, bool pressed) {
+    struct wlr_event_keyboard_key event = {
+        .time_msec = time_msec,
+        .keycode = keycode,
+        .update_state = true,
+        .state = pressed ? WL_KEYBOARD_KEY_STATE_PRESSED
+            : WL_KEYBOARD_KEY_STATE_RELEASED,
+    };
+    wlr_keyboard_notify_key(device->keyboard, &event);
+}
+"""
+
+wlroots_ffi = FFI()
+wlroots_ffi.set_source(
+    "libnext._wlroots",
+    wlr.SOURCE + SOURCE,
+    libraries=["wlroots"],
+    define_macros=[("WLR_USE_UNSTABLE", None)],
+    include_dirs=["/usr/include/pixman-1", wlr.include_dir],
+)
+
+wlroots_ffi.include(wlr.ffi_builder)
+wlroots_ffi.cdef(CDEF)
+
+if __name__ == "__main__":
+    wlroots_ffi.compile()
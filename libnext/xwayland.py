@@ -0,0 +1,277 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import logging
+from typing import Any
+
+from pywayland.server import Listener
+from wlroots import xwayland
+from wlroots.wlr_types import SceneNode
+
+from libnext._wlroots import lib as next_lib
+from libnext.metrics import Metric
+from libnext.util import Listeners
+from libnext.window import Window
+
+log = logging.getLogger("Next: XWayland")
+
+
+def new_xwayland_surface(core, surface: xwayland.Surface) -> None:
+    """
+    Wrap a new X11 window, override-redirect windows like menus and tooltips
+    place themselves and aren't managed.
+    """
+    if surface.override_redirect:
+        core.unmanaged.append(XWaylandUnmanaged(core, surface))
+    else:
+        core.pending_windows.add(XWaylandWindow(core, surface))
+
+
+class XWaylandWindow(Window[xwayland.Surface]):
+    """
+    X11 client connecting through Xwayland.
+    """
+
+    def __init__(self, core, surface: xwayland.Surface):
+        super().__init__(core, surface)
+
+        self.wm_class = surface.wm_class
+        # X11 has no configure serials, a transaction waits on the first
+        # commit with the size that was sent.
+        self.configure_size: tuple[int, int] | None = None
+        self.commit_listener: Listener | None = None
+
+        self.add_listener(surface.destroy_event, self._on_destroy)
+        self.add_listener(surface.map_event, self._on_map)
+        self.add_listener(surface.unmap_event, self._on_unmap)
+        self.add_listener(surface.request_configure_event, self._on_request_configure)
+        self.add_listener(surface.request_fullscreen_event, self._on_request_fullscreen)
+        self.add_listener(surface.set_title_event, self._on_set_title)
+        self.add_listener(surface.set_class_event, self._on_set_class)
+        self.add_listener(
+            surface.set_override_redirect_event, self._on_set_override_redirect
+        )
+
+    def _on_map(self, _listener: Listener, _data: Any) -> None:
+        if self not in self.core.pending_windows:
+            return
+
+        log.debug("Managing a new X11 window")
+        self.core.pending_windows.remove(self)
+        self.mapped = True
+
+        surface = self.surface
+        self.width = self.float_width = surface.width
+        self.height = self.float_height = surface.height
+        self.sent_size = (self.width, self.height)
+
+        # The wlr_surface only exists while the X11 window is mapped.
+        self.surface_node = SceneNode(
+            next_lib.wlr_scene_subsurface_tree_create(
+                self.scene_node._ptr, surface.surface._ptr
+            )
+        )
+        self.commit_listener = self.add_listener(
+            surface.surface.commit_event, self._on_commit
+        )
+
+        if surface.title:
+            self.name = surface.title
+            self.ftm_handle.set_title(self.name)
+        if self.wm_class:
+            self.ftm_handle.set_app_id(self.wm_class)
+
+        self.set_fullscreen(surface.fullscreen)
+        self.map_toplevel()
+
+    def _on_unmap(self, _listener: Listener, _data: Any) -> None:
+        self.configure_size = None
+        self.unmap_toplevel()
+
+        if self.commit_listener is not None:
+            self.remove_listener(self.commit_listener)
+            self.commit_listener = None
+        if self.surface_node is not None:
+            next_lib.wlr_scene_node_destroy(self.surface_node._ptr)
+            self.surface_node = None
+
+        # X11 windows get mapped again after being withdrawn.
+        self.core.pending_windows.add(self)
+
+    def get_pid(self) -> int:
+        return self.surface.pid
+
+    def kill(self) -> None:
+        self.surface.close()
+
+    def activate(self, active: bool) -> None:
+        self.activated = active
+        self.surface.activate(active)
+        self.ftm_handle.set_activated(active)
+        self.update_border_color()
+
+    def configure(self, x: int, y: int, width: int, height: int) -> bool:
+        bw = self.borderwidth
+        width = max(width - 2 * bw, 1)
+        height = max(height - 2 * bw, 1)
+        # X11 clients position their own popups, so they're told about
+        # moves too.
+        self.surface.configure(x + bw, y + bw, width, height)
+        if (width, height) == self.sent_size:
+            self.core.metrics.incr(Metric.CONFIGURES_SUPPRESSED)
+            return False
+        self.sent_size = self.configure_size = (width, height)
+        self.core.metrics.incr(Metric.CONFIGURES_SENT)
+        return True
+
+    def _on_commit(self, _listener: Listener, _data: Any) -> None:
+        # The X11 side takes the configured size as soon as it's sent, only
+        # the committed surface state tells when a buffer of that size is in.
+        size = self.configure_size
+        current = self.surface.surface.current
+        if size is not None and size == (current.width, current.height):
+            self.configure_size = None
+            self.core.transactions.committed(self)
+
+    def _on_request_configure(
+        self, _listener: Listener, event: xwayland.SurfaceConfigureEvent
+    ) -> None:
+        if not self.mapped:
+            # Nothing is placed yet, let the client pick its initial geometry.
+            self.surface.configure(event.x, event.y, event.width, event.height)
+            return
+
+        # Tiled windows stay where the layout put them.
+        bw = self.borderwidth
+        self.surface.configure(
+            self.x + bw,
+            self.y + bw,
+            max(self.width - 2 * bw, 1),
+            max(self.height - 2 * bw, 1),
+        )
+
+    def _on_request_fullscreen(self, _listener: Listener, _data: Any) -> None:
+        self.set_fullscreen(self.surface.fullscreen)
+
+    def _on_set_title(self, _listener: Listener, _data: Any) -> None:
+        title = self.surface.title
+        if title and title != self.name:
+            self.name = title
+            self.ftm_handle.set_title(self.name)
+            self.core.control.emit("window-title", window=self)
+
+    def _on_set_class(self, _listener: Listener, _data: Any) -> None:
+        wm_class = self.surface.wm_class
+        if wm_class and wm_class != self.wm_class:
+            self.wm_class = wm_class
+            self.ftm_handle.set_app_id(wm_class)
+
+    def _on_set_override_redirect(self, _listener: Listener, _data: Any) -> None:
+        if self.mapped:
+            return
+        self.core.pending_windows.discard(self)
+        self.destroy()
+        new_xwayland_surface(self.core, self.surface)
+
+
+class XWaylandUnmanaged(Listeners):
+    """
+    Override-redirect X11 window, it's shown above the managed windows where
+    the client puts it.
+    """
+
+    def __init__(self, core, surface: xwayland.Surface):
+        self.core = core
+        self.surface = surface
+        self.scene_node: SceneNode | None = None
+        # Whether this window took keyboard focus when it got mapped.
+        self.focused: bool = False
+
+        self.add_listener(surface.destroy_event, self._on_destroy)
+        self.add_listener(surface.map_event, self._on_map)
+        self.add_listener(surface.unmap_event, self._on_unmap)
+        self.add_listener(surface.request_configure_event, self._on_request_configure)
+        self.add_listener(surface.set_geometry_event, self._on_set_geometry)
+        self.add_listener(
+            surface.set_override_redirect_event, self._on_set_override_redirect
+        )
+
+    def destroy(self) -> None:
+        self.destroy_listeners()
+        if self in self.core.unmanaged:
+            self.core.unmanaged.remove(self)
+
+    def surface_at(self, lx: float, ly: float) -> tuple[Any, float, float] | None:
+        if self.scene_node is None:
+            return None
+        surface, sx, sy = self.surface.surface_at(
+            lx - self.surface.x, ly - self.surface.y
+        )
+        if surface is None:
+            return None
+        return surface, sx, sy
+
+    def _on_map(self, _listener: Listener, _data: Any) -> None:
+        surface = self.surface
+        self.scene_node = SceneNode(
+            next_lib.wlr_scene_subsurface_tree_create(
+                self.core.unmanaged_tree._ptr, surface.surface._ptr
+            )
+        )
+        self.scene_node.set_position(surface.x, surface.y)
+        # Keep the newest one on top for surface_at().
+        self.core.unmanaged.remove(self)
+        self.core.unmanaged.append(self)
+
+        seat = self.core.seat
+        if surface.or_surface_wants_focus() and self.core.focus.layer is None:
+            self.focused = True
+            seat.keyboard_notify_enter(surface.surface, seat.keyboard)
+
+    def _on_unmap(self, _listener: Listener, _data: Any) -> None:
+        if self.scene_node is not None:
+            next_lib.wlr_scene_node_destroy(self.scene_node._ptr)
+            self.scene_node = None
+        if self.focused:
+            self.focused = False
+            self.core.focus.restore()
+
+    def _on_destroy(self, _listener: Listener, _data: Any) -> None:
+        self.destroy()
+
+    def _on_request_configure(
+        self, _listener: Listener, event: xwayland.SurfaceConfigureEvent
+    ) -> None:
+        self.surface.configure(event.x, event.y, event.width, event.height)
+
+    def _on_set_geometry(self, _listener: Listener, _data: Any) -> None:
+        if self.scene_node is not None:
+            self.scene_node.set_position(self.surface.x, self.surface.y)
+
+    def _on_set_override_redirect(self, _listener: Listener, _data: Any) -> None:
+        if self.scene_node is not None:
+            return
+        self.destroy()
+        new_xwayland_surface(self.core, self.surface)
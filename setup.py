@@ -24,36 +24,20 @@
 # EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-import subprocess
 import sys
 
 from setuptools import setup
-from setuptools.command.install import install
+from setuptools.command.build_py import build_py
 
 
-class CheckProtocolExistence(install):
-    def protocol_check(self) -> bool:
-        try:
-            from pywayland.protocol.next_control_v1 import NextControlV1
-            from pywayland.protocol.river_layout_v3 import RiverLayoutManagerV3
-            return True
-        except ModuleNotFoundError:
-            return False
+class BuildProtocols(build_py):
+    # Protocol bindings are generated into libnext/_protocols and shipped
+    # with the package, nothing gets scanned at runtime.
+    def run(self):
+        from libnext.protocols_build import build
 
-    def finalize_options(self):
-        if not self.protocol_check():
-            subprocess.run(
-                [
-                    "python3",
-                    "-m",
-                    "pywayland.scanner",
-                    "-i",
-                    "./protocols/river-layout-v3.xml",
-                    "./protocols/next-control-v1.xml",
-                    "/usr/share/wayland/wayland.xml",
-                ]
-            )
-        install.finalize_options(self)
+        build()
+        build_py.run(self)
 
 
 def get_cffi_modules():
@@ -69,6 +53,9 @@ def get_cffi_modules():
         cffi_modules.append(
             'libnext/libinput_ffi_build.py:libinput_ffi'
         )
+        cffi_modules.append(
+            'libnext/wlroots_ffi_build.py:wlroots_ffi'
+        )
     except ImportError:
         print(
             "Failed to find pywlroots. "
@@ -79,7 +66,16 @@ def get_cffi_modules():
 
 
 setup(
-    cmdclass={'install': CheckProtocolExistence},
+    cmdclass={'build_py': BuildProtocols},
+    # libnext._protocols only exists once BuildProtocols ran, so nothing is
+    # discovered.
+    packages=[
+        'libnext',
+        'libnext._protocols',
+        'libnext._protocols.next_control_v1',
+        'libnext._protocols.river_layout_v3',
+        'libnext._protocols.wayland',
+    ],
     cffi_modules=get_cffi_modules(),
     include_package_data=True,
 )
@@ -0,0 +1,122 @@
+# Copyright (c) 2022 Shinyzenith <aakashsensharma@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY
+# OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import pytest
+
+from libnext.render_scheduler import (
+    RENDER_TIME_SLACK_NS,
+    RenderScheduler,
+    parse_max_render_time,
+)
+
+MS = 1_000_000
+# 60 Hz, as the headless backend reports it.
+REFRESH_MHZ = 60_000
+REFRESH_NS = 1_000_000_000_000 // REFRESH_MHZ
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000 * MS
+
+    def __call__(self) -> int:
+        return self.now
+
+
+def scheduler(max_render_time) -> tuple[RenderScheduler, Clock]:
+    clock = Clock()
+    return RenderScheduler(max_render_time, clock), clock
+
+
+def test_parse_max_render_time():
+    assert parse_max_render_time("off") is None
+    assert parse_max_render_time("auto") == "auto"
+    assert parse_max_render_time("5") == 5
+    with pytest.raises(ValueError):
+        parse_max_render_time("0")
+
+
+def test_off_never_delays():
+    render_scheduler, _clock = scheduler(None)
+    render_scheduler.presented(REFRESH_NS)
+    assert render_scheduler.delay_ms() == 0
+
+
+def test_no_delay_before_first_present():
+    render_scheduler, _clock = scheduler(5)
+    assert render_scheduler.delay_ms() == 0
+
+
+def test_fixed_delay_right_after_vblank():
+    render_scheduler, _clock = scheduler(5)
+    render_scheduler.presented(REFRESH_NS)
+    # 16.67 ms until the next vblank, minus 5 ms to render.
+    assert render_scheduler.delay_ms() == 11
+
+
+def test_fixed_delay_later_in_the_period():
+    render_scheduler, clock = scheduler(5)
+    render_scheduler.presented(REFRESH_NS)
+    clock.now += 4 * MS
+    assert render_scheduler.delay_ms() == 7
+
+
+def test_vblanks_without_presents():
+    render_scheduler, clock = scheduler(5)
+    render_scheduler.presented(REFRESH_NS)
+    clock.now += 3 * REFRESH_NS + 4 * MS
+    assert render_scheduler.delay_ms() == 7
+
+
+def test_too_late_to_delay():
+    render_scheduler, clock = scheduler(5)
+    render_scheduler.presented(REFRESH_NS)
+    clock.now += 12 * MS
+    assert render_scheduler.delay_ms() == 0
+
+
+def test_headless_refresh_fallback():
+    render_scheduler, _clock = scheduler(5)
+    # Headless presents with a refresh of 0, the output's rate is used.
+    render_scheduler.presented(0, REFRESH_MHZ)
+    assert render_scheduler.refresh_ns == REFRESH_NS
+    assert render_scheduler.delay_ms() == 11
+
+
+def test_unknown_refresh_never_delays():
+    render_scheduler, _clock = scheduler(5)
+    render_scheduler.presented(0, 0)
+    assert render_scheduler.delay_ms() == 0
+
+
+def test_auto_follows_render_times():
+    render_scheduler, _clock = scheduler("auto")
+    render_scheduler.presented(REFRESH_NS)
+    # Nothing to estimate from yet.
+    assert render_scheduler.delay_ms() == 0
+
+    render_scheduler.rendered(2 * MS)
+    render_scheduler.rendered(4 * MS - RENDER_TIME_SLACK_NS)
+    # The slowest render plus slack is a 4 ms budget.
+    assert render_scheduler.delay_ms() == 12